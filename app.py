@@ -1,14 +1,45 @@
 import src.py.gui.components as components
 import src.py.gui.styles as styles
 from src.py.database.database import Database
+from src.py.database.session_cache import SessionCache
+from src.py.utils.figure_cache import FigureCache
 from src.py.utils.utils import static_line_plot_factory, static_heat_plot_factory
-from src.py.utils.utils import Utils
+from src.py.utils.utils import Utils, relayout_x_range
+
+import atexit
+import numpy as np
 
 from dash import Dash, Input, Output, State, callback, no_update
 import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
 
 db = Database(Utils.DATABASE_PATH)
+atexit.register(db.close)
+
+# Sesiones ya leidas, las dos graficas y el zoom salen de la misma lectura
+sessions = SessionCache(db)
+
+# Figuras ya construidas, se invalidan solas cuando cambia la version de la sesion
+figures = FigureCache(Utils.FIGURE_CACHE_MB * 2**20, Utils.FIGURE_CACHE_DIR, Utils.FIGURE_CACHE_DISK_MB * 2**20)
+
+def snap_x_range(x_range):
+    '''
+    agranda x_range hacia afuera a una malla de ~1% de su ancho (en muestras
+    enteras), asi zooms casi iguales comparten la misma figura en el cache
+    '''
+    if x_range is None:
+        return None
+    x0, x1 = x_range
+    step = 10 ** max(int(np.floor(np.log10(max(x1 - x0, 1) / 100))), 0)
+    return (int(np.floor(x0 / step) * step), int(np.ceil(x1 / step) * step))
+
+def figure_key(kind, uid, checked, sensors, event_types, x_range=None):
+    '''
+    llave de una figura del explorador, incluye la resolucion configurada
+    '''
+    return (kind, uid, tuple(checked), tuple(sensors), tuple(event_types), x_range,
+            Utils.PLOT_MAX_POINTS, Utils.PLOT_DOWNSAMPLE, Utils.PLOT_RENDERER,
+            Utils.HEAT_RASTER_WIDTH, Utils.HEAT_AGGREGATE)
 
 dbc_css = ("https://cdn.jsdelivr.net/gh/AnnMarieW/dash-bootstrap-templates@V1.0.2/dbc.min.css")
 
@@ -33,6 +64,25 @@ def toggle_offcanvas(n1, is_open):
 def toggle_offcanvas(clicks):
     return db.list_sessions().to_dict("records")
 
+@callback(
+    Output("event_select", "options"),
+    Output("event_select", "value"),
+    Input("data_table", "selected_row_ids"),
+    prevent_initial_call=True
+)
+def event_options(selection):
+    '''
+    los tipos de evento que hay en la sesion, todos marcados; asi tambien
+    aparecen los que ya no estan en el catalogo de la configuracion
+    '''
+    if not selection:
+        return no_update, no_update
+    uid = selection[0]
+    if not db.events_exists(uid):
+        return [], []
+    names = list(dict.fromkeys(db.get_events(uid)["event"].astype(str)))
+    return names, names
+
 @callback(
     Output("session_title", "children"),
     Output("session_notes", "children"),
@@ -41,14 +91,74 @@ def toggle_offcanvas(clicks):
     Input("data_table", "selected_row_ids"),
     Input('data_checklist','value'),
     Input('sensor_select','value'),
+    Input('event_select','value'),
     prevent_initial_call=True
 )
-def set_session(selection, checked, sensors):
+def set_session(selection, checked, sensors, event_types):
+    uid = selection[0]
+    version = db.session_version(uid)
+    # la sesion solo se lee si falta alguna de las dos figuras
     return (
-        f"session_{selection[0]}",
-        str(db.get_notes(selection[0])["notes"][0]), 
-        static_line_plot_factory(selection[0],db, checked,sensors),
-        static_heat_plot_factory(selection[0],db, checked,sensors)
+        f"session_{uid}",
+        str(version[-1]), 
+        figures.get(
+            figure_key("lines", uid, checked, sensors, event_types), version,
+            lambda: static_line_plot_factory(sessions.get(uid, version), checked, sensors, event_types=event_types)
+        ),
+        figures.get(
+            figure_key("heat", uid, checked, sensors, event_types), version,
+            lambda: static_heat_plot_factory(sessions.get(uid, version), checked, sensors, event_types=event_types)
+        )
+    )
+
+@callback(
+    Output('line_graph', 'figure', allow_duplicate=True),
+    Input('line_graph', 'relayoutData'),
+    State("data_table", "selected_row_ids"),
+    State('data_checklist','value'),
+    State('sensor_select','value'),
+    State('event_select','value'),
+    prevent_initial_call=True
+)
+def zoom_lines(relayout, selection, checked, sensors, event_types):
+    '''
+    vuelve a leer solo el rango visible cada vez que se hace zoom, asi el
+    tamaño de la figura no depende de la duracion de la sesion
+    '''
+    x_range = relayout_x_range(relayout)
+    if not selection or x_range is None:
+        return no_update
+    x_range = None if x_range == "auto" else snap_x_range(x_range)
+    uid = selection[0]
+    version = db.session_version(uid)
+    return figures.get(
+        figure_key("lines", uid, checked, sensors, event_types, x_range), version,
+        lambda: static_line_plot_factory(sessions.get(uid, version), checked, sensors, x_range, event_types)
+    )
+
+@callback(
+    Output("spec_graph", "figure", allow_duplicate=True),
+    Input("spec_graph", "relayoutData"),
+    State("data_table", "selected_row_ids"),
+    State('data_checklist','value'),
+    State('sensor_select','value'),
+    State('event_select','value'),
+    prevent_initial_call=True
+)
+def zoom_heat(relayout, selection, checked, sensors, event_types):
+    '''
+    vuelve a agregar el heatmap al ancho de heat_raster_width solo con el
+    rango visible, asi el zoom gana detalle sin mandar toda la sesion
+    '''
+    x_range = relayout_x_range(relayout)
+    if not selection or x_range is None:
+        return no_update
+    x_range = None if x_range == "auto" else snap_x_range(x_range)
+    uid = selection[0]
+    version = db.session_version(uid)
+    return figures.get(
+        figure_key("heat", uid, checked, sensors, event_types, x_range), version,
+        lambda: static_heat_plot_factory(sessions.get(uid, version), checked, sensors, x_range, event_types)
     )
 
 if __name__ =="__main__":
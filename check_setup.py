@@ -39,7 +39,7 @@ def check_nilearn_data():
         if os.path.exists(fsaverage.pial_right) and os.path.exists(fsaverage.pial_left):
             print("✓ Datos anatómicos del cerebro descargados correctamente")
             print(f"  Ubicación: {os.path.dirname(fsaverage.pial_right)}")
-            return True
+            return check_brain_cache()
         else:
             print("Error: Los archivos de datos no se encontraron")
             return False
@@ -48,6 +48,22 @@ def check_nilearn_data():
         print(f"Error al verificar datos de nilearn: {str(e)}")
         return False
 
+def check_brain_cache():
+    """Generar el paquete local de mallas para que la app arranque sin nilearn."""
+    try:
+        from src.py.brain_viz.brain_cache import LOD_OPTIONS, build_bundle, load_bundle
+
+        for mesh in LOD_OPTIONS:
+            if load_bundle(mesh) is None:
+                print(f"Precalculando geometría del cerebro ({mesh}, solo la primera vez)...")
+                build_bundle(mesh)
+        print("✓ Paquetes de mallas del cerebro listos")
+        return True
+
+    except Exception as e:
+        print(f"Error al generar el paquete de mallas: {str(e)}")
+        return False
+
 def check_config_file():
     """Verificar si existe el archivo config.json."""
     import os
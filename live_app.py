@@ -1,33 +1,73 @@
 from src.py.utils.utils import Utils, event_factory
 from src.py.database.database import Database
+from src.py.acquisition.poller import SensorPoller
+from src.py.acquisition.recorder import Recorder
+from src.py.acquisition.replay import ReplaySource, MIN_SPEED, MAX_SPEED
 import numpy as np
 import src.py.live_gui.components as components
+from src.py.live_gui.stream import register_stream
 import src.py.brain_viz.live_brain_callbacks_clean as brain_callbacks  # Import simplified brain callbacks
 from datetime import datetime
+import argparse
+import atexit
+from werkzeug.serving import is_running_from_reloader
 
 from dash import Dash, Input, Output, callback, State, no_update, ctx
 import dash_bootstrap_components as dbc
 
-# Generar UID más estable (solo hasta segundos para evitar cambios)
-uid = int(datetime.now().strftime('%Y%m%d%H%M%S'))
+DEBUG = True
+
+parser = argparse.ArgumentParser(description="Visualizador de los datos en vivo")
+parser.add_argument("--replay", type=int, metavar="UID",
+                    help="repite la sesion grabada UID en lugar de leer los sensores")
+parser.add_argument("--speed", type=float, default=MIN_SPEED,
+                    help=f"velocidad de la repeticion, de {MIN_SPEED:g} a {MAX_SPEED:g} veces la original")
+parser.add_argument("--start", type=float, default=0.0,
+                    help="segundo de la sesion donde empieza la repeticion")
+parser.add_argument("--loop", action="store_true",
+                    help="vuelve a empezar la repeticion al terminar")
+# parse_known_args deja pasar los argumentos de quien importe este modulo
+args, _ = parser.parse_known_args()
+
 header = Database.get_params_header(Utils.SENSORS.values(), Utils.SENSOR_PARAMS)
 
-db = Database(Utils.DATABASE_PATH)
+db = Database(Utils.DATABASE_PATH, layout=Utils.STORAGE_LAYOUT)
+
+if args.replay is not None:
+    uid = args.replay
+    if not db.session_exists(uid):
+        parser.error(f"no existe session_{uid} en {Utils.DATABASE_PATH}")
+    if db.is_legacy_session(uid):
+        parser.error(f"session_{uid} es de una version antigua sin la hora de cada muestra y no se puede repetir")
+
+    # La repeticion pasa por el mismo Recorder, pero sin volver a guardar nada
+    try:
+        source = ReplaySource(db, uid, speed=args.speed, start=args.start, loop=args.loop)
+    except ValueError as e:
+        parser.error(str(e))
+    components.replay_box.children = components.replay_controls(source.duration(), source.speed)
+    recorder = Recorder(db, uid, header, source, interval=source.interval, persist=False)
+else:
+    # Generar UID más estable (solo hasta segundos para evitar cambios)
+    uid = int(datetime.now().strftime('%Y%m%d%H%M%S'))
 
-# Verificar y crear todas las tablas necesarias al inicio
-if not db.session_table_exists():
-    db.create_session_table()
+    # Verificar y crear todas las tablas necesarias al inicio
+    if not db.session_table_exists():
+        db.create_session_table()
 
-# Verificar si la sesión ya existe para evitar errores de duplicado
-if not db.session_info_exists(uid):
-    db.record_session_info(uid, Utils.SENSORS.keys(),"")
+    # Verificar si la sesión ya existe para evitar errores de duplicado
+    if not db.session_info_exists(uid):
+        db.record_session_info(uid, Utils.SENSORS.keys(),"")
 
-# Crear las tablas de datos específicas de la sesión
-if not db.session_exists(uid):
-    db.create_session(uid, header)
+    # Crear las tablas de datos específicas de la sesión
+    if not db.session_exists(uid):
+        db.create_session(uid, header)
 
-if not db.events_exists(uid):
-    db.create_events(uid)
+    if not db.events_exists(uid):
+        db.create_events(uid)
+
+    # El Recorder es el unico que sondea y guarda, los callbacks solo leen su estado
+    recorder = Recorder(db, uid, header, SensorPoller(Utils.SENSORS))
 
 custom_css = r'''
 .accordion-item:last-of-type > .accordion-header .accordion-button.collapsed {
@@ -47,16 +87,25 @@ def sim():
     return np.random.random_sample((11))
 
 @callback(
-    Output('graph_box', 'children'),
+    Output('lines_tab', 'tab_style'),
+    Output('bars_tab', 'tab_style'),
+    Output('heat_tab', 'tab_style'),
+    Output('graphs_tabs', 'active_tab'),
     Output('sensor_name', "children"),
     Input('quantity_select','value'),
-    Input('sensor_select','value')
+    Input('sensor_select','value'),
+    State('graphs_tabs', 'active_tab')
 )
-def select_quantity(qty, sensor):
-    if qty == 'individual':
-        return [components.graphs_ind], sensor
-    elif qty == 'todos':
-        return [components.graphs_all], "Todos los sensores"
+def select_quantity(qty, sensor, active_tab):
+    visible = components.TABS_BY_QUANTITY[qty]
+    tab_styles = [
+        {} if tab in visible else {"display": "none"}
+        for tab in ("lines-tab", "bars-tab", "heat-tab")
+    ]
+    if active_tab not in visible:
+        active_tab = components.DEFAULT_TAB[qty]
+    name = sensor if qty == 'individual' else "Todos los sensores"
+    return *tab_styles, active_tab, name
     
 @callback(
     Output('main_title', "children"),
@@ -65,102 +114,126 @@ def select_quantity(qty, sensor):
 )
 def on_startup(children):
     # Solo retornar los datos iniciales, la inicialización ya se hizo
+    if not recorder.persist:
+        return f"session_{uid} (repetición x{recorder.poller.speed:g})", {"uid":uid}
     return f"session_{uid}", {"uid":uid}
 
 @callback(
     Output("memory", "data",  allow_duplicate=True),
     Output("time_text", "children"),
+    Output("line_graph", "extendData"),
+    Output("bar_graph", "extendData"),
+    Output("heat_graph", "extendData"),
+    Output("live_events", "data"),
     State("memory", "data"),
+    State("time_text", "children"),
+    State("graphs_tabs", "active_tab"),
+    State('sensor_select','value'),
+    State('data_checklist','value'),
     Input('timer', "n_intervals"),
     prevent_initial_call=True
 )
-def store_data(data, intervals):
+def live_tick(data, shown, active_tab, sensor, checked, intervals):
+    '''
+    un solo callback por tick: publica la ultima muestra en memory y extiende
+    solo la grafica de la pestaña visible, las ocultas no se calculan
+    '''
     
     # Validar que data no sea None y contenga uid
     if data is None or 'uid' not in data:
-        return data, intervals  # Retornar sin procesar si no hay datos válidos
+        return no_update, no_update, no_update, no_update, no_update, no_update
 
-    sensor_live = [Utils.get_data(sensor) for sensor in Utils.SENSORS.values()]
+    sample_index, latest = recorder.latest()
 
-    db.record_data(data['uid'],header,sensor_live)
+    # Sin muestras nuevas desde el ultimo tick no se reenvia nada
+    if latest is None or shown == sample_index:
+        return no_update, no_update, no_update, no_update, no_update, no_update
 
-    tmp = {
-        "uid":data['uid'],
-    }
+    # eventos de la repeticion desde la ultima muestra mostrada
+    after = shown if isinstance(shown, int) else sample_index - 1
+    marked = [event for _, event in recorder.events_since(after)]
+    events = {"index": sample_index, "events": marked} if marked else no_update
 
-    for sensor, readings in zip(Utils.SENSORS.keys(),sensor_live):
-        tmp.update({sensor:{}})
-        for key, value in zip(Utils.SENSOR_PARAMS_MAP.keys(), readings):
-            tmp[sensor].update(
-                {key:value}
-            )
+    extend = {tab: no_update for tab in ("lines-tab", "bars-tab", "heat-tab")}
+    if active_tab == "lines-tab":
+        extend[active_tab] = line_extend(latest, sensor, checked, sample_index)
+    elif active_tab == "bars-tab":
+        extend[active_tab] = bar_extend(latest, sensor, checked)
+    elif active_tab == "heat-tab":
+        extend[active_tab] = heat_extend(latest, sample_index)
 
-    return tmp, intervals
+    return latest, sample_index, extend["lines-tab"], extend["bars-tab"], extend["heat-tab"], events
 
 @callback(
-    Output("line_graph", "extendData"),
-    State('sensor_select','value'),
-    State('data_checklist','value'),
-    State('timer', "n_intervals"),
-    Input("memory", "data"),
+    Output("event_text", "children"),
+    Input("live_events", "data"),
     prevent_initial_call=True
 )
-def update_lines(sensor,checked,timer,data):
-    
-    # Validar que data no sea None y contenga el sensor
-    if data is None or sensor not in data:
-        return [{"x":[], "y":[]}, [], 0]  # Retornar datos vacíos si no hay datos válidos
+def show_events(events):
+    if not events:
+        return no_update
+    return f'{", ".join(events["events"])} (muestra {events["index"]})'
+
+@callback(
+    Output("replay_speed", "value"),
+    Input("replay_speed", "value"),
+    Input("replay_seek", "value"),
+    prevent_initial_call=True
+)
+def control_replay(speed, seconds):
+    '''
+    cambia la velocidad o salta a otro momento de la repeticion; el Recorder
+    sondea con el intervalo de la nueva velocidad
+    '''
+    if recorder.persist:
+        return no_update
+    if ctx.triggered_id == "replay_speed":
+        if speed is None:
+            return no_update
+        recorder.interval = recorder.poller.set_speed(speed)
+        return recorder.poller.speed
+    if seconds is not None:
+        recorder.poller.seek(seconds)
+        # al terminar una repeticion sin loop el hilo se detuvo, saltar la reanuda
+        if not recorder.is_stopped():
+            recorder.start()
+    return no_update
 
+def checked_values(data, sensor, checked):
     to_plot = []
 
-    for key, value in data[sensor].items():
+    # se recorre la configuracion: un parametro que falta en la muestra queda en None
+    for key in Utils.SENSOR_PARAMS_MAP.keys():
         if key in checked:
-            to_plot.append([value])
+            to_plot.append([data[sensor].get(key)])
         else:
             to_plot.append([None])
-    
-    t = np.full((len(to_plot),1), timer)
 
-    return [{"x":t, "y":to_plot}, np.arange(len(to_plot)), 15]
+    return to_plot
 
-@callback(
-    Output("bar_graph", "extendData"),
-    State('sensor_select','value'),
-    State('data_checklist','value'),
-    State('timer', "n_intervals"),
-    Input("memory", "data"),
-    prevent_initial_call=True
-)
-def update_bars(sensor,checked,timer,data):
+def line_extend(data, sensor, checked, sample):
     
-    # Validar que data no sea None y contenga el sensor
-    if data is None or sensor not in data:
-        return [{"x":[], "y":[]}, [], 0]  # Retornar datos vacíos si no hay datos válidos
+    # Validar que data contenga el sensor
+    if sensor not in data:
+        return no_update
 
-    to_plot = []
+    to_plot = checked_values(data, sensor, checked)
+    t = np.full((len(to_plot),1), sample)
 
-    for key, value in data[sensor].items():
-        if key in checked:
-            to_plot.append([value])
-        else:
-            to_plot.append([None])
+    return [{"x":t, "y":to_plot}, np.arange(len(to_plot)), 15]
+
+def bar_extend(data, sensor, checked):
     
+    # Validar que data contenga el sensor
+    if sensor not in data:
+        return no_update
+
+    to_plot = checked_values(data, sensor, checked)
     t = np.arange(len(to_plot))[:, np.newaxis]
 
     return [{"x":t, "y":to_plot}, np.arange(len(to_plot)), 1]
 
-@callback(
-    Output("heat_graph", "extendData"),
-    State("heat_graph", "figure"),
-    State('timer', "n_intervals"),
-    Input("memory", "data"),
-    prevent_initial_call=True
-)
-def update_heatmap(fig, timer, data):
-    
-    # Validar que data no sea None y contenga los sensores necesarios
-    if data is None:
-        return [{"x":[], "y":[], "z":[]}, [], 0]  # Retornar datos vacíos si no hay datos válidos
+def heat_extend(data, sample):
     
     to_z = []
     for key in Utils.SENSORS.keys():
@@ -168,12 +241,12 @@ def update_heatmap(fig, timer, data):
             to_z.append([[data[key]["attention"]]])
             to_z.append([[data[key]["meditation"]]])
         else:
-            to_z.append([[0]])  # Valor por defecto si no hay datos
-            to_z.append([[0]])
+            to_z.append([[None]])  # Sin datos el heatmap queda con un hueco
+            to_z.append([[None]])
     
     t = np.full(
         (len(Utils.SENSORS.keys())*2,1),
-        timer
+        sample
     )
 
     return [
@@ -192,11 +265,12 @@ def update_heatmap(fig, timer, data):
 )
 def record_event(data, time, *args):
     
-    # Validar que data no sea None y contenga uid
-    if data is None or 'uid' not in data:
+    # Validar que data no sea None y contenga uid; una repeticion no agrega eventos
+    if data is None or 'uid' not in data or not recorder.persist:
         return no_update
         
-    db.record_event(data["uid"], time, ctx.triggered_id)
+    # El tiempo del evento es el numero de muestras grabadas hasta el momento
+    db.record_event(data["uid"], recorder.latest()[0], ctx.triggered_id)
     return no_update
 
 @callback(
@@ -227,6 +301,15 @@ def toggle_offcanvas(n1, is_open):
 
 if __name__ =="__main__":
     # Registrar callbacks del cerebro
-    brain_callbacks.register_brain_callbacks(app)
-    app.run(host="0.0.0.0", debug=True, port=8050)
+    brain_callbacks.register_brain_callbacks(app, tabs_id="graphs_tabs", db=db)
+    if Utils.LIVE_TRANSPORT == "sse":
+        # el Recorder empuja cada muestra, live_tick solo corre con "poll"
+        register_stream(app, recorder, Utils.SENSORS.keys())
+    # Con debug el reloader ejecuta este archivo dos veces, solo el proceso que sirve graba
+    if not DEBUG or is_running_from_reloader():
+        # atexit corre en orden inverso: primero se detiene el Recorder y luego se cierra la base
+        atexit.register(db.close)
+        recorder.start()
+        atexit.register(recorder.stop)
+    app.run(host="0.0.0.0", debug=DEBUG, port=8050)
     
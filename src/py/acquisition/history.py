@@ -0,0 +1,164 @@
+"""
+Historial reciente de cada sesion en memoria del servidor.
+
+El Recorder agrega cada muestra a un buffer circular de NumPy de capacidad
+fija; el timeline y el modo historico del cerebro lo consultan por indice o
+por tiempo, asi el navegador no tiene que guardar ni reenviar el historial.
+"""
+
+import threading
+
+import numpy as np
+
+# Muestras que se conservan por sesion (una hora a 1 muestra por segundo)
+DEFAULT_CAPACITY = 3600
+
+_histories = {}
+_histories_lock = threading.Lock()
+
+
+class SessionHistory:
+    """
+    Buffer circular con las ultimas muestras de una sesion.
+    """
+
+    def __init__(self, uid:int, sensors:list[str], params:list[str], capacity:int = DEFAULT_CAPACITY,
+                 start:float = None) -> None:
+        '''
+        sensors y params dan el orden de las lecturas que recibe append, el
+        mismo de la configuracion; start es la marca de tiempo del segundo 0,
+        por defecto la de la primera muestra
+        '''
+        self.uid = uid
+        self.sensors = list(sensors)
+        self.params = list(params)
+        self.capacity = capacity
+        self.start = start
+        self._samples = np.zeros(capacity, dtype=np.int64)
+        self._times = np.zeros(capacity, dtype=np.float64)
+        self._values = np.full((capacity, len(self.sensors), len(self.params)), np.nan)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    def append(self, sample:int, timestamp:float, readings:list) -> None:
+        '''
+        guarda una muestra, readings tiene una lectura por sensor; si el buffer
+        esta lleno se sobreescribe la mas antigua
+        '''
+        with self._lock:
+            if self.start is None:
+                self.start = timestamp
+            slot = self._count % self.capacity
+            self._samples[slot] = sample
+            self._times[slot] = timestamp - self.start
+            # una lectura incompleta deja NaN en los parametros que faltan
+            self._values[slot] = np.nan
+            for row, reading in zip(self._values[slot], readings):
+                reading = np.asarray(reading, dtype=np.float64).ravel()[:len(self.params)]
+                row[:len(reading)] = reading
+            self._count += 1
+
+    def clear(self) -> None:
+        '''
+        descarta las muestras guardadas, el segundo 0 no cambia
+        '''
+        with self._lock:
+            self._count = 0
+
+    def _ordered(self, array:np.ndarray) -> np.ndarray:
+        # el buffer no esta lleno: las muestras estan en orden desde el inicio
+        if self._count <= self.capacity:
+            return array[:self._count]
+        slot = self._count % self.capacity
+        return np.concatenate([array[slot:], array[:slot]])
+
+    def times(self) -> np.ndarray:
+        '''
+        segundos desde la primera muestra de la sesion, de la mas antigua a
+        la mas reciente
+        '''
+        with self._lock:
+            return self._ordered(self._times)
+
+    def nearest(self, seconds:float) -> int:
+        '''
+        posicion (0 = mas antigua) de la muestra mas cercana a seconds, None
+        si no hay muestras
+        '''
+        times = self.times()
+        if len(times) == 0:
+            return None
+        position = int(np.searchsorted(times, seconds))
+        if position == len(times) or (position > 0 and seconds - times[position - 1] <= times[position] - seconds):
+            position -= 1
+        return position
+
+    def at(self, position:int) -> tuple[int, float, dict]:
+        '''
+        devuelve (sample, segundos, muestra en el formato de memory) de la
+        posicion dada, -1 es la mas reciente
+        '''
+        with self._lock:
+            size = min(self._count, self.capacity)
+            if position < 0:
+                position += size
+            if not 0 <= position < size:
+                raise IndexError(f"posicion {position} fuera del historial")
+            slot = (self._count - size + position) % self.capacity
+            return int(self._samples[slot]), float(self._times[slot]), self._memory(slot)
+
+    def _memory(self, slot:int) -> dict:
+        memory = {"uid": self.uid}
+        for sensor, readings in zip(self.sensors, self._values[slot]):
+            memory[sensor] = {param: float(value) for param, value in zip(self.params, readings) if not np.isnan(value)}
+        return memory
+
+    def after(self, sample:int) -> list[tuple[int, dict]]:
+        '''
+        (sample, muestra en el formato de memory) de cada muestra guardada con
+        sample mayor al dado, de la mas antigua a la mas reciente
+        '''
+        with self._lock:
+            size = min(self._count, self.capacity)
+            slots = [(self._count - size + position) % self.capacity for position in range(size)]
+            return [(int(self._samples[slot]), self._memory(slot)) for slot in slots if self._samples[slot] > sample]
+
+    def averages(self, params:list[str], position:int = -1) -> list[float]:
+        '''
+        promedio entre sensores de cada parametro en params para una posicion,
+        los NaN se ignoran
+        '''
+        columns = [self.params.index(param) for param in params]
+        with self._lock:
+            size = min(self._count, self.capacity)
+            if size == 0:
+                return [0.0] * len(columns)
+            if position < 0:
+                position += size
+            slot = (self._count - size + position) % self.capacity
+            values = self._values[slot][:, columns]
+        valid = ~np.isnan(values)
+        counts = valid.sum(axis=0)
+        totals = np.where(valid, values, 0.0).sum(axis=0)
+        return [float(total / count) if count else 0.0 for total, count in zip(totals, counts)]
+
+
+def open_history(uid:int, sensors:list[str], params:list[str], capacity:int = DEFAULT_CAPACITY,
+                 start:float = None) -> SessionHistory:
+    '''
+    devuelve el historial de la sesion uid, creandolo si no existe
+    '''
+    with _histories_lock:
+        if uid not in _histories:
+            _histories[uid] = SessionHistory(uid, sensors, params, capacity, start)
+        return _histories[uid]
+
+
+def get_history(uid:int) -> SessionHistory:
+    '''
+    historial de la sesion uid, None si esta sesion no se graba en este proceso
+    '''
+    return _histories.get(uid)
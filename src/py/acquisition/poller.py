@@ -0,0 +1,84 @@
+"""
+Sondeo concurrente de los sensores ESP8266.
+
+Cada tick consulta a todos los sensores al mismo tiempo, de modo que la
+latencia del tick depende del sensor mas lento y no de la suma de todos.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+
+from src.py.utils.utils import Utils
+
+
+class SensorPoller:
+    """
+    Consulta todos los sensores en paralelo con un pool de hilos acotado y un
+    limite de tiempo por tick.
+    """
+
+    def __init__(self, sensors:dict, deadline:float = None, max_workers:int = None) -> None:
+        '''
+        sensors es el diccionario nombre -> url de la configuracion, el orden
+        de las lecturas devueltas es el mismo que el de este diccionario
+
+        deadline es el tiempo maximo en segundos que espera un tick, los
+        sensores que no respondan a tiempo o respondan con error se reportan
+        como perdidos; tambien es el timeout de cada peticion
+        '''
+        self.sensors = dict(sensors)
+        self.deadline = Utils.POLL_DEADLINE if deadline is None else deadline
+        self.last_latency = 0.0
+        self.last_missed = []
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or max(len(self.sensors), 1),
+            thread_name_prefix="sensor_poll"
+        )
+        # peticiones que siguen en curso de ticks anteriores, por sensor
+        self._pending = {}
+
+    def poll(self) -> tuple[list[np.ndarray], list[str]]:
+        '''
+        hace un tick de sondeo y devuelve (lecturas, perdidos)
+
+        lecturas tiene un arreglo por sensor en el orden de self.sensors, los
+        sensores que fallaron o no respondieron antes del limite reciben un
+        arreglo de NaN (se guardan como NULL) y aparecen en perdidos
+        '''
+        start = time.perf_counter()
+
+        futures = {}
+        for name, url in self.sensors.items():
+            pending = self._pending.get(name)
+            if pending is not None and not pending.done():
+                # el sensor sigue ocupado con un tick anterior, no se encola otra peticion
+                futures[name] = pending
+                continue
+            # fetch_data lanza el error en lugar de devolver datos simulados
+            futures[name] = self._executor.submit(Utils.fetch_data, url, self.deadline)
+
+        wait(futures.values(), timeout=self.deadline)
+
+        readings = []
+        missed = []
+        self._pending = {}
+        for name, future in futures.items():
+            if future.done() and future.exception() is None:
+                readings.append(future.result())
+            else:
+                if not future.done():
+                    self._pending[name] = future
+                missed.append(name)
+                readings.append(np.full(len(Utils.SENSOR_PARAMS), np.nan))
+
+        self.last_latency = time.perf_counter() - start
+        self.last_missed = missed
+        return readings, missed
+
+    def close(self) -> None:
+        '''
+        libera los hilos del pool sin esperar peticiones pendientes
+        '''
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,196 @@
+"""
+Hilo de adquisicion independiente del navegador.
+
+El Recorder es el unico dueño del ciclo sondeo -> marca de tiempo -> guardado,
+los callbacks de Dash solo leen su ultimo estado, asi cada muestra se guarda
+una sola vez sin importar cuantas pestañas esten abiertas.
+"""
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from src.py.acquisition.history import open_history
+from src.py.utils.utils import Utils
+
+# Eventos recientes que se guardan en memoria para events_since
+EVENTS_KEPT = 256
+
+
+class Recorder:
+    """
+    Graba las lecturas de los sensores a una frecuencia fija en un hilo de fondo.
+    """
+
+    def __init__(self, db, uid:int, header:list[str], poller, interval:float = None, persist:bool = True) -> None:
+        '''
+        db es la Database donde se guardan las muestras, uid y header los de la
+        sesion ya creada con create_session, poller un SensorPoller e interval
+        el periodo de muestreo en segundos
+
+        con persist=False las muestras solo se publican y no se guardan, para
+        repetir una sesion con poller=ReplaySource (ver acquisition.replay)
+        '''
+        self.db = db
+        self.uid = uid
+        self.header = header
+        self.poller = poller
+        self.interval = Utils.SAMPLE_INTERVAL if interval is None else interval
+        self.persist = persist
+        self.sample_index = 0
+        self.last_timestamp = None
+        self._latest = None
+        # (numero de muestras, evento) de los eventos que trae el poller, p. ej. una repeticion
+        self._events = deque(maxlen=EVENTS_KEPT)
+        self._lock = threading.Lock()
+        # avisa a quien espera en wait_for_sample cada vez que se graba una muestra
+        self._new_sample = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._thread = None
+        # historial reciente en memoria para el timeline y el modo historico
+        # una repeticion cuenta los segundos desde el inicio de la sesion original
+        self.history = open_history(
+            uid, Utils.SENSORS.keys(), Utils.SENSOR_PARAMS_MAP.keys(),
+            start=getattr(poller, "start_timestamp", None)
+        )
+
+    def start(self) -> None:
+        '''
+        arranca el hilo de adquisicion, llamar mas de una vez no tiene efecto
+        '''
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="recorder", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout:float = None) -> None:
+        '''
+        detiene el hilo y espera a que termine el tick en curso
+        '''
+        self._stop.set()
+        with self._new_sample:
+            self._new_sample.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.poller.close()
+
+    def latest(self) -> tuple[int, dict]:
+        '''
+        devuelve (numero de muestras grabadas, ultima muestra) con la muestra en
+        el formato de la store "memory": {"uid":..., sensor:{parametro:valor}}
+
+        la muestra es None si todavia no se graba nada
+        '''
+        with self._lock:
+            return self.sample_index, self._latest
+
+    def samples_since(self, after:int) -> list[tuple[int, dict]]:
+        '''
+        (numero de muestras grabadas, muestra) de cada muestra grabada despues
+        de las primeras after, con la misma numeracion que latest; las que ya
+        salieron del historial en memoria no se pueden recuperar
+        '''
+        # el historial guarda el sample de cada muestra, que es el conteo menos uno
+        pending = [(sample + 1, memory) for sample, memory in self.history.after(after - 1)]
+        index, latest = self.latest()
+        if latest is not None and index > after and (not pending or pending[-1][0] < index):
+            pending.append((index, latest))
+        return pending
+
+    def events_since(self, after:int) -> list[tuple[int, str]]:
+        '''
+        (numero de muestras grabadas, evento) de cada evento que trajo el
+        poller despues de las primeras after muestras, con la numeracion de latest
+        '''
+        with self._lock:
+            return [(index, event) for index, event in self._events if index > after]
+
+    def is_stopped(self) -> bool:
+        '''
+        True despues de llamar a stop
+        '''
+        return self._stop.is_set()
+
+    def wait_for_sample(self, after:int, timeout:float = None) -> tuple[int, dict]:
+        '''
+        espera hasta que haya mas de after muestras grabadas (o timeout
+        segundos, o que se detenga el Recorder) y devuelve lo mismo que latest
+        '''
+        with self._new_sample:
+            self._new_sample.wait_for(lambda: self.sample_index > after or self._stop.is_set(), timeout)
+            return self.sample_index, self._latest
+
+    def _run(self) -> None:
+        next_tick = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self._tick()
+            except StopIteration:
+                # la fuente se termino (fin de una repeticion)
+                print(f'Fin de la repeticion de session_{self.uid}')
+                break
+
+            # se programa contra el reloj para no acumular el tiempo del tick
+            next_tick += self.interval
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                next_tick = time.monotonic()
+                delay = 0
+            self._stop.wait(delay)
+
+    def _tick(self) -> None:
+        readings, missed = self.poller.poll()
+        # una repeticion trae la hora en que se grabo la muestra original
+        timestamp = getattr(self.poller, "last_timestamp", None) or time.time()
+        if missed and self.persist:
+            print(f'Sensores sin respuesta en {self.poller.last_latency:.2f}s: {", ".join(missed)}')
+
+        if self.persist:
+            try:
+                self.db.record_data(self.uid, self.header, readings, self.sample_index, timestamp)
+            except Exception as e:
+                # el error puede ser de una muestra anterior que el hilo de escritura
+                # no guardo; esta lectura tampoco se encolo y se descarta, el
+                # siguiente tick sondea lecturas nuevas con el mismo sample_index
+                print(f'No se pudo guardar la muestra {self.sample_index} '
+                      f'({self.db.write_errors} filas perdidas en total): {e}')
+                return
+
+        # saltar hacia atras en una repeticion empieza un historial nuevo
+        if self.last_timestamp is not None and timestamp < self.last_timestamp:
+            self.history.clear()
+        self.history.append(self.sample_index, timestamp, readings)
+        sample = to_memory(self.uid, readings)
+        with self._new_sample:
+            self._latest = sample
+            self.last_timestamp = timestamp
+            self.sample_index += 1
+            for event in getattr(self.poller, "last_events", ()):
+                self._events.append((self.sample_index, event))
+            self._new_sample.notify_all()
+
+
+def to_memory(uid:int, readings:list) -> dict:
+    '''
+    convierte una lista de lecturas (una por sensor, en el orden de la
+    configuracion) al diccionario que usan los callbacks de la app en vivo
+    '''
+    tmp = {
+        "uid":uid,
+    }
+
+    for sensor, values in zip(Utils.SENSORS.keys(), readings):
+        tmp.update({sensor:{}})
+        for key, value in zip(Utils.SENSOR_PARAMS_MAP.keys(), values):
+            # un sensor sin respuesta (NaN) no manda sus parametros, igual que
+            # SessionHistory, y las graficas quedan con un hueco
+            if np.isnan(value):
+                continue
+            tmp[sensor].update(
+                {key:float(value)}
+            )
+
+    return tmp
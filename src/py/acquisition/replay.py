@@ -0,0 +1,163 @@
+"""
+Repeticion de una sesion grabada a traves del mismo flujo que los datos en vivo.
+
+ReplaySource tiene la interfaz de SensorPoller (poll y close), asi que el
+Recorder la sondea igual que a los sensores: cada tick devuelve la siguiente
+fila de session_{uid} y el cerebro, las barras, el heatmap y el timeline la
+reciben sin cambios. Con persist=False el Recorder no vuelve a guardarla.
+
+La velocidad va de MIN_SPEED a MAX_SPEED veces la original y se puede saltar
+a cualquier momento con seek. Como cada tick avanza exactamente una muestra,
+una repeticion a velocidad fija sirve tambien como carga reproducible para
+medir el dashboard en vivo.
+"""
+
+import threading
+
+import numpy as np
+
+from src.py.database.scrubber import WINDOW_SAMPLES
+from src.py.utils.utils import Utils
+
+MIN_SPEED = 1.0
+MAX_SPEED = 50.0
+
+
+class ReplaySource:
+    """
+    Lee una sesion guardada fila por fila con el ritmo en que se grabo.
+    """
+
+    def __init__(self, db, uid:int, speed:float = MIN_SPEED, start:float = 0.0,
+                 loop:bool = False, window:int = WINDOW_SAMPLES) -> None:
+        '''
+        db es la Database con la sesion uid, start los segundos desde la
+        primera muestra donde empieza la repeticion y loop si vuelve a empezar
+        al terminar; las filas se leen en bloques de window muestras
+
+        las sesiones antiguas sin columna de tiempo no se pueden repetir
+        '''
+        self.db = db
+        self.uid = uid
+        self.loop = loop
+        self.window = window
+        # mismo diccionario que SensorPoller, el orden de las lecturas es el de la configuracion
+        self.sensors = dict(Utils.SENSORS)
+        self.last_latency = 0.0
+        self.last_missed = []
+        self.last_timestamp = None
+        self.last_events = []
+
+        self._samples, self._times = db.sample_times(uid)
+        if len(self._samples) == 0:
+            raise ValueError(f"session_{uid} no tiene muestras")
+        self.start_timestamp = float(self._times[0])
+
+        # periodo original: la mediana no se ve afectada por pausas o muestras perdidas
+        steps = np.diff(self._times)
+        self.period = float(np.median(steps)) if len(steps) else Utils.SAMPLE_INTERVAL
+
+        events = db.get_events(uid) if db.events_exists(uid) else None
+        if events is None or events.empty:
+            self._event_times, self._event_names = np.zeros(0), []
+        else:
+            # el tiempo de un evento es el numero de muestras grabadas al marcarlo
+            events = events.sort_values("time")
+            self._event_times = events["time"].to_numpy(dtype=np.float64)
+            self._event_names = events["event"].tolist()
+
+        self._lock = threading.Lock()
+        self._frame = None
+        self._frame_index = None
+        self._position = 0
+        self.speed = MIN_SPEED
+        self.set_speed(speed)
+        self.seek(start)
+
+    @property
+    def interval(self) -> float:
+        '''
+        periodo en segundos con el que hay que sondear para la velocidad actual
+        '''
+        return self.period / self.speed
+
+    def duration(self) -> float:
+        '''
+        segundos entre la primera y la ultima muestra de la sesion
+        '''
+        return float(self._times[-1] - self._times[0])
+
+    def set_speed(self, speed:float) -> float:
+        '''
+        cambia la velocidad (se limita a [MIN_SPEED, MAX_SPEED]) y devuelve el
+        nuevo intervalo, que hay que pasarle al Recorder
+        '''
+        self.speed = float(np.clip(speed, MIN_SPEED, MAX_SPEED))
+        return self.interval
+
+    def seek(self, seconds:float) -> int:
+        '''
+        salta a la primera muestra tomada en o despues de seconds (desde la
+        primera muestra) y devuelve su sample
+        '''
+        with self._lock:
+            self._position = int(np.searchsorted(self._times - self._times[0], seconds))
+            self._position = min(self._position, len(self._samples) - 1)
+            return int(self._samples[self._position])
+
+    def _row(self, sample:int):
+        index = sample // self.window
+        if index != self._frame_index:
+            self._frame = self.db.get_session(self.uid, index * self.window, (index + 1) * self.window)
+            self._frame_index = index
+        if sample not in self._frame.index:
+            return None
+        return self._frame.loc[sample]
+
+    def _readings(self, row) -> tuple[list[np.ndarray], list[str]]:
+        readings = []
+        missed = []
+        for sensor in self.sensors:
+            columns = [f"{param}{Utils.SENSORS_MAP[sensor]}" for param in Utils.SENSOR_PARAMS]
+            values = None
+            if row is not None and all(column in row.index for column in columns):
+                values = row[columns].to_numpy(dtype=np.float64)
+            if values is None or np.isnan(values).any():
+                # un sensor que no esta en la sesion se manda en ceros, como en el heatmap
+                missed.append(sensor)
+                values = np.zeros(len(Utils.SENSOR_PARAMS))
+            readings.append(values)
+        return readings, missed
+
+    def poll(self) -> tuple[list[np.ndarray], list[str]]:
+        '''
+        devuelve (lecturas, perdidos) de la siguiente muestra, igual que
+        SensorPoller.poll; last_timestamp queda con la hora en que se grabo y
+        last_events con los eventos marcados desde la muestra anterior
+
+        al terminar la sesion vuelve al inicio si loop, si no lanza StopIteration
+        '''
+        with self._lock:
+            if self._position >= len(self._samples):
+                if not self.loop:
+                    raise StopIteration
+                self._position = 0
+            position = self._position
+            self._position += 1
+
+        sample = int(self._samples[position])
+        readings, missed = self._readings(self._row(sample))
+
+        # un evento con tiempo t se marco despues de grabar la muestra t - 1
+        previous = self._samples[position - 1] + 1 if position > 0 else -np.inf
+        first, last = np.searchsorted(self._event_times, [previous, sample + 1], side="right")
+        self.last_events = self._event_names[first:last]
+        self.last_timestamp = float(self._times[position])
+        self.last_missed = missed
+        return readings, missed
+
+    def close(self) -> None:
+        '''
+        no hay conexiones propias que cerrar, la Database es de quien la abrio
+        '''
+        self._frame = None
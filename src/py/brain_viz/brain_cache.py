@@ -0,0 +1,137 @@
+"""
+Paquete local con la geometria del cerebro precalculada.
+
+La primera vez se obtienen las mallas fsaverage y los mapas de referencia con
+nilearn y se guardan como archivos .npy; despues se abren con memory-map, sin
+importar nilearn y sin conexion a internet.
+
+Se puede generar de antemano con:
+
+    python -m src.py.brain_viz.brain_cache
+"""
+
+import os
+import shutil
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = "brain_cache"
+DEFAULT_MESH = "fsaverage"
+
+# Niveles de detalle que se pueden elegir en la app: malla de nilearn -> etiqueta
+LOD_OPTIONS = {
+    "fsaverage5": "Baja (10k vértices)",
+    "fsaverage6": "Media (41k vértices)",
+    "fsaverage": "Alta (164k vértices)",
+}
+SIDES = ("right", "left")
+
+# Archivos por hemisferio; extent guarda x_min, x_max, y_min, y_max, z_min, z_max y el span
+BUNDLE_ARRAYS = ("coords", "faces", "reference", "extent")
+BOUNDS_KEYS = ("x_min", "x_max", "y_min", "y_max", "z_min", "z_max")
+
+
+def _compute_bounds(coords):
+    x = coords[:, 0]
+    y = coords[:, 1]
+    z = coords[:, 2]
+    return {
+        'x_min': float(x.min()),
+        'x_max': float(x.max()),
+        'y_min': float(y.min()),
+        'y_max': float(y.max()),
+        'z_min': float(z.min()),
+        'z_max': float(z.max()),
+    }
+
+
+def _brain_span(bounds):
+    return np.sqrt(
+        (bounds['x_max'] - bounds['x_min']) ** 2
+        + (bounds['y_max'] - bounds['y_min']) ** 2
+        + (bounds['z_max'] - bounds['z_min']) ** 2
+    )
+
+
+def bundle_dir(mesh:str = DEFAULT_MESH, root:str = DEFAULT_CACHE_DIR) -> str:
+    return os.path.join(root, mesh)
+
+
+def build_bundle(mesh:str = DEFAULT_MESH, root:str = DEFAULT_CACHE_DIR) -> str:
+    '''
+    calcula la geometria con nilearn y la guarda en bundle_dir(mesh, root),
+    devuelve la carpeta del paquete
+    '''
+    from nilearn import datasets, surface
+
+    fsaverage = datasets.fetch_surf_fsaverage(mesh=mesh)
+    motor_img = datasets.load_sample_motor_activation_image()
+
+    target = bundle_dir(mesh, root)
+    # se escribe en una carpeta temporal para no dejar paquetes a medias
+    tmp = target + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    for side in SIDES:
+        mesh_side = surface.load_surf_mesh(getattr(fsaverage, f"pial_{side}"))
+        coords = np.asarray(mesh_side.coordinates)
+        bounds = _compute_bounds(coords)
+
+        np.save(os.path.join(tmp, f"coords_{side}.npy"), coords)
+        np.save(os.path.join(tmp, f"faces_{side}.npy"), np.asarray(mesh_side.faces))
+        np.save(os.path.join(tmp, f"reference_{side}.npy"), np.asarray(surface.vol_to_surf(motor_img, mesh_side)))
+        np.save(os.path.join(tmp, f"extent_{side}.npy"), np.r_[[bounds[key] for key in BOUNDS_KEYS], _brain_span(bounds)])
+
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+    return target
+
+
+def load_bundle(mesh:str = DEFAULT_MESH, root:str = DEFAULT_CACHE_DIR) -> dict:
+    '''
+    abre el paquete con memory-map y devuelve por hemisferio un diccionario
+    con coords, faces, reference, bounds y span; None si el paquete no existe
+    '''
+    folder = bundle_dir(mesh, root)
+    paths = {
+        (side, name): os.path.join(folder, f"{name}_{side}.npy")
+        for side in SIDES for name in BUNDLE_ARRAYS
+    }
+    if not all(os.path.exists(path) for path in paths.values()):
+        return None
+
+    surfaces = {}
+    for side in SIDES:
+        extent = np.load(paths[(side, "extent")])
+        surfaces[side] = {
+            "coords": np.load(paths[(side, "coords")], mmap_mode="r"),
+            "faces": np.load(paths[(side, "faces")], mmap_mode="r"),
+            "reference": np.load(paths[(side, "reference")], mmap_mode="r"),
+            "bounds": dict(zip(BOUNDS_KEYS, map(float, extent[:6]))),
+            "span": float(extent[6]),
+        }
+    return surfaces
+
+
+def load_surfaces(mesh:str = DEFAULT_MESH, root:str = DEFAULT_CACHE_DIR) -> dict:
+    '''
+    carga el paquete y lo genera primero si todavia no existe
+    '''
+    surfaces = load_bundle(mesh, root)
+    if surfaces is None:
+        build_bundle(mesh, root)
+        surfaces = load_bundle(mesh, root)
+    return surfaces
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Precalcula la geometria del cerebro 3D")
+    parser.add_argument("--mesh", nargs="+", default=list(LOD_OPTIONS), choices=list(LOD_OPTIONS), help="mallas de nilearn a precalcular, por defecto todas")
+    parser.add_argument("--root", default=DEFAULT_CACHE_DIR, help="carpeta donde se guardan los paquetes")
+    args = parser.parse_args()
+
+    for mesh in args.mesh:
+        print(f"Paquete guardado en {build_bundle(mesh, args.root)}")
@@ -1,8 +1,12 @@
+import dash_bootstrap_components as dbc
 from dash import dcc, html
 
-from src.py.brain_viz.brain_visualizer import brain_viz
+from src.py.brain_viz.brain_visualizer import LOD_OPTIONS, brain_viz
 from src.py.brain_viz.simple_timeline import create_simple_timeline
 
+# tab_id de la pestaña del cerebro en las pestañas del dashboard
+BRAIN_TAB_ID = "brain-tab"
+
 def create_brain_component():
     """
     Crear el componente de visualización del cerebro para el dashboard.
@@ -15,15 +19,31 @@ def create_brain_component():
     timeline_component = create_simple_timeline()
 
     brain_graph = html.Div([
+        # Copia de memory que solo se actualiza con la pestaña del cerebro visible
+        dcc.Store(id='brain_memory'),
         # Store para mantener el estado de la cámara
         dcc.Store(id='brain_camera_store', data={}),
+        # Indica si brain_graph ya tiene la malla, para mandar solo intensidades
+        dcc.Store(id='brain_render_state', data={'mesh': bool(initial_figure.data), 'lod': brain_viz.lod}),
+        # Tablas de influencia para calcular la intensidad en el navegador (brain_render_mode = "client")
+        dcc.Store(id='brain_influence_tables'),
+        # En modo "client" el navegador solo escribe aquí cuando hace falta mandar la malla
+        dcc.Store(id='brain_rebuild_request'),
         # Store para controlar si se debe pausar las actualizaciones durante interacción
         dcc.Store(id='brain_interaction_store', data={'is_interacting': False, 'last_interaction': 0}),
-        # Timer para detectar cuando termina la interacción
-        dcc.Interval(id='interaction_timer', interval=200, n_intervals=0),
         
         # Timeline component (parte superior)
         timeline_component,
+
+        # Nivel de detalle de la malla
+        dbc.InputGroup([
+            dbc.InputGroupText("Detalle de la malla"),
+            dbc.Select(
+                id='brain_lod_select',
+                options=[{'label': label, 'value': lod} for lod, label in LOD_OPTIONS.items()],
+                value=brain_viz.lod
+            )
+        ], size='sm', style={'max-width': '360px', 'margin-bottom': '10px'}),
         
         # Visualización 3D del cerebro
         html.Div([
@@ -65,6 +85,4 @@ def get_brain_tab():
     Retorna:
     - dash_bootstrap_components.Tab: Componente de pestaña del cerebro
     """
-    import dash_bootstrap_components as dbc
-    
-    return dbc.Tab([create_brain_component()], label="Cerebro 3D", tab_id="brain-tab")
\ No newline at end of file
+    return dbc.Tab([create_brain_component()], label="Cerebro 3D", tab_id=BRAIN_TAB_ID)
\ No newline at end of file
@@ -5,27 +5,9 @@ Componente de visualización 3D del cerebro usando nilearn y plotly.
 import numpy as np
 import plotly.graph_objects as go
 
-
-def _compute_bounds(coords):
-    x = coords[:, 0]
-    y = coords[:, 1]
-    z = coords[:, 2]
-    return {
-        'x_min': float(x.min()),
-        'x_max': float(x.max()),
-        'y_min': float(y.min()),
-        'y_max': float(y.max()),
-        'z_min': float(z.min()),
-        'z_max': float(z.max()),
-    }
-
-
-def _brain_span(bounds):
-    return np.sqrt(
-        (bounds['x_max'] - bounds['x_min']) ** 2
-        + (bounds['y_max'] - bounds['y_min']) ** 2
-        + (bounds['z_max'] - bounds['z_min']) ** 2
-    )
+from src.py.brain_viz.brain_cache import DEFAULT_MESH, LOD_OPTIONS, load_surfaces
+from src.py.brain_viz.intensity_encoding import ENCODINGS, color_range, encode_intensity, levels, typed_array
+from src.py.utils.utils import Utils
 
 
 def _normalize_metric(value):
@@ -36,17 +18,24 @@ def _coverage_radius(brain_span, coverage_factor, base_factor):
     return brain_span * base_factor * coverage_factor
 
 
-def _apply_fade(intensity, coords, center, radius, multiplier):
+def _sorted_distances(coords, center):
+    """Distancias de cada vértice al centro, ordenadas, con el índice de cada vértice."""
+    distances = np.linalg.norm(coords - center, axis=1)
+    order = np.argsort(distances, kind='stable')
+    return order, distances[order]
+
+
+def _apply_fade(intensity, order, distances, radius, multiplier):
     if radius <= 0:
         return
 
-    distances = np.linalg.norm(coords - center, axis=1)
-    mask = distances <= radius
-    if not np.any(mask):
+    # distances está ordenado: los vértices dentro del radio son un prefijo
+    count = np.searchsorted(distances, radius, side='right')
+    if count == 0:
         return
 
-    fade = (1 - distances[mask] / radius) * multiplier
-    intensity[mask] += fade
+    fade = (1 - distances[:count] / radius) * multiplier
+    intensity[order[:count]] += fade
 
 
 def _center_parietal_left(bounds):
@@ -101,103 +90,125 @@ _SENSOR_CONFIG = {
     'sensor_e': [{'side': 'right', 'center_fn': _center_parietal_right, 'metric': 'meditation', 'base_factor': 0.25}],
 }
 
+def _build_influence(surfaces):
+    """
+    Precalcular, para cada sensor, las distancias ordenadas de todos los
+    vértices de su hemisferio al centro de su región.
+
+    Los centros solo dependen de los límites de la malla, así que en cada
+    actualización basta con cortar la tabla en el radio que corresponde a
+    signal_strength en lugar de recalcular distancias sobre toda la malla.
+    """
+    influence = {}
+    for sensor_name, configs in _SENSOR_CONFIG.items():
+        entries = []
+        for config in configs:
+            side = surfaces[config['side']]
+            if side['span'] <= 0:
+                continue
+            order, distances = _sorted_distances(side['coords'], config['center_fn'](side['bounds']))
+            entries.append({
+                'side': config['side'],
+                'metric': config['metric'],
+                'base_factor': config['base_factor'],
+                'span': side['span'],
+                'order': order,
+                'distances': distances,
+            })
+        influence[sensor_name] = entries
+    return influence
+
+
 class BrainVisualizer:
     """
     Visualizador 3D del cerebro usando datos de superficie de nilearn y plotly para el renderizado.
     """
     
-    def __init__(self):
-        """Inicializar el visualizador del cerebro con carga diferida."""
-        self.fsaverage = None
-        self.mesh_right = None
-        self.mesh_left = None
-        self.reference_map_right = None
-        self.reference_map_left = None
+    def __init__(self, lod=DEFAULT_MESH, encoding="float"):
+        """
+        Inicializar el visualizador del cerebro con carga diferida.
+
+        lod es la malla que se usa cuando un método no recibe una; cada nivel
+        de detalle se carga por separado la primera vez que se pide.
+        encoding es como se mandan las intensidades al navegador (ver
+        intensity_encoding).
+        """
+        self.lod = lod
+        self.encoding = encoding
         self.fig = None
-        self.coords_right = None
-        self.coords_left = None
-        self.bounds_right = None
-        self.bounds_left = None
-        self.brain_span_right = 0.0
-        self.brain_span_left = 0.0
-        self._initialized = False
+        self._surfaces = {}
         
-    def _lazy_init(self):
-        """Inicialización diferida de los componentes de nilearn."""
-        if self._initialized:
+    def _lazy_init(self, lod=None):
+        """
+        Inicialización diferida de la geometría de un nivel de detalle.
+
+        Las mallas, mapas de referencia y metadatos geométricos se leen con
+        memory-map del paquete de brain_cache; nilearn solo se usa la primera
+        vez, para generar ese paquete.
+        """
+        lod = lod or self.lod
+        if lod in self._surfaces:
             return True
             
         try:
-            from nilearn import datasets, surface
-            
-            # Cargar datos de superficie fsaverage
-            self.fsaverage = datasets.fetch_surf_fsaverage()
-            
-            # Cargar datos de muestra de activación motora para referencia
-            motor_img = datasets.load_sample_motor_activation_image()
-            
-            # Cargar mallas para ambos hemisferios
-            self.mesh_right = surface.load_surf_mesh(self.fsaverage.pial_right)
-            self.mesh_left = surface.load_surf_mesh(self.fsaverage.pial_left)
-            
-            # Obtener mapas de activación de referencia
-            self.reference_map_right = surface.vol_to_surf(motor_img, self.mesh_right)
-            self.reference_map_left = surface.vol_to_surf(motor_img, self.mesh_left)
-
-            # Pre-calcular metadatos geométricos para minimizar trabajo posterior
-            self.coords_right = self.mesh_right.coordinates
-            self.coords_left = self.mesh_left.coordinates
-            self.bounds_right = _compute_bounds(self.coords_right)
-            self.bounds_left = _compute_bounds(self.coords_left)
-            self.brain_span_right = _brain_span(self.bounds_right)
-            self.brain_span_left = _brain_span(self.bounds_left)
-            
-            self._initialized = True
+            surfaces = load_surfaces(lod)
+            surfaces['influence'] = _build_influence(surfaces)
+            self._surfaces[lod] = surfaces
             return True
             
         except Exception as e:
             # Silently fail if nilearn components cannot be initialized
             return False
+
+    def _surface(self, lod=None):
+        """Geometría cargada de un nivel de detalle, o None si no se pudo cargar."""
+        return self._surfaces.get(lod or self.lod)
         
-    def create_brain_figure(self, intensity_right=None, intensity_left=None, title_suffix=""):
+    def create_brain_figure(self, intensity_right=None, intensity_left=None, title_suffix="", lod=None):
         """
         Crear una figura 3D del cerebro con mapas de intensidad personalizados opcionales.
         
         Parámetros:
         - intensity_right: Valores de intensidad personalizados para el hemisferio derecho
         - intensity_left: Valores de intensidad personalizados para el hemisferio izquierdo
+        - lod: Malla a usar (ver LOD_OPTIONS), por defecto la del visualizador
         
         Retorna:
         - plotly.graph_objects.Figure: Visualización 3D del cerebro
         """
         
         # Intentar inicializar componentes de nilearn
-        if not self._lazy_init():
+        if not self._lazy_init(lod):
             return self._create_fallback_figure()
+        right, left = self._surface(lod)['right'], self._surface(lod)['left']
         
         # Usar intensidad proporcionada o usar referencia por defecto
-        map_right = intensity_right if intensity_right is not None else self.reference_map_right
-        map_left = intensity_left if intensity_left is not None else self.reference_map_left
+        map_right = intensity_right if intensity_right is not None else right['reference']
+        map_left = intensity_left if intensity_left is not None else left['reference']
+        colors = color_range(self.encoding)
         
         # Crear nueva figura
         fig = go.Figure()
         
         # Agregar hemisferio derecho con barra de color
         fig.add_trace(go.Mesh3d(
-            x=self.mesh_right.coordinates[:, 0],
-            y=self.mesh_right.coordinates[:, 1],
-            z=self.mesh_right.coordinates[:, 2],
-            i=self.mesh_right.faces[:, 0],
-            j=self.mesh_right.faces[:, 1],
-            k=self.mesh_right.faces[:, 2],
-            intensity=map_right,
+            x=right['coords'][:, 0],
+            y=right['coords'][:, 1],
+            z=right['coords'][:, 2],
+            i=right['faces'][:, 0],
+            j=right['faces'][:, 1],
+            k=right['faces'][:, 2],
+            intensity=encode_intensity(map_right, self.encoding),
             colorscale="RdBu_r",  # Azul = negativo, Rojo = positivo
-            cmin=-6,              # Escala mínima
-            cmax=6,               # Escala máxima
+            cmin=colors['cmin'],  # Escala mínima
+            cmax=colors['cmax'],  # Escala máxima
             colorbar=dict(
                 title=dict(text="Activación"),
                 thickness=15,
-                len=0.75
+                len=0.75,
+                # con intensidades cuantizadas las marcas siguen en [-6, 6]
+                tickvals=colors['tickvals'],
+                ticktext=colors['ticktext']
             ),
             showscale=True,
             name="Right Hemisphere",
@@ -206,16 +217,16 @@ class BrainVisualizer:
         
         # Agregar hemisferio izquierdo sin barra de color
         fig.add_trace(go.Mesh3d(
-            x=self.mesh_left.coordinates[:, 0],
-            y=self.mesh_left.coordinates[:, 1],
-            z=self.mesh_left.coordinates[:, 2],
-            i=self.mesh_left.faces[:, 0],
-            j=self.mesh_left.faces[:, 1],
-            k=self.mesh_left.faces[:, 2],
-            intensity=map_left,
+            x=left['coords'][:, 0],
+            y=left['coords'][:, 1],
+            z=left['coords'][:, 2],
+            i=left['faces'][:, 0],
+            j=left['faces'][:, 1],
+            k=left['faces'][:, 2],
+            intensity=encode_intensity(map_left, self.encoding),
             colorscale="RdBu_r",
-            cmin=-6,
-            cmax=6,
+            cmin=colors['cmin'],
+            cmax=colors['cmax'],
             showscale=False,  # Evitar segunda barra de color
             name="Left Hemisphere",
             opacity=1
@@ -258,7 +269,7 @@ class BrainVisualizer:
         
         return fig
     
-    def update_brain_intensity(self, all_sensors_data):
+    def update_brain_intensity(self, all_sensors_data, lod=None):
         """
         Actualizar la intensidad del cerebro basada en datos EEG de todos los sensores con efecto de mapa de calor.
         Mapea cada sensor a regiones específicas del cerebro con:
@@ -274,29 +285,21 @@ class BrainVisualizer:
         
         Parámetros:
         - all_sensors_data: Diccionario con datos de todos los sensores
+        - lod: Malla sobre la que se calcula, cada una tiene sus propias tablas de distancias
         
         Retorna:
         - tuple: (intensity_right, intensity_left) arreglos
         """
-        if not self._initialized:
+        surface = self._surface(lod)
+        if surface is None:
             return None, None
 
-        intensity_right = np.zeros_like(self.reference_map_right)
-        intensity_left = np.zeros_like(self.reference_map_left)
-
-        side_data = {
-            'left': {
-                'intensity': intensity_left,
-                'coords': self.coords_left,
-                'bounds': self.bounds_left,
-                'span': self.brain_span_left,
-            },
-            'right': {
-                'intensity': intensity_right,
-                'coords': self.coords_right,
-                'bounds': self.bounds_right,
-                'span': self.brain_span_right,
-            },
+        intensity_right = np.zeros(surface['right']['reference'].shape)
+        intensity_left = np.zeros(surface['left']['reference'].shape)
+
+        side_intensity = {
+            'left': intensity_left,
+            'right': intensity_right,
         }
 
         for sensor_name, sensor_data in all_sensors_data.items():
@@ -307,19 +310,14 @@ class BrainVisualizer:
             meditation_norm = _normalize_metric(sensor_data.get('meditation', 50))
             coverage_factor = (sensor_data.get('signal_strength', 50) / 100.0) * 0.9 + 0.1
 
-            for config in _SENSOR_CONFIG.get(sensor_name, []):
-                side = side_data.get(config['side'])
-                if not side or side['span'] <= 0:
-                    continue
-
-                center = config['center_fn'](side['bounds'])
-                radius = _coverage_radius(side['span'], coverage_factor, config['base_factor'])
-                multiplier = attention_norm if config['metric'] == 'attention' else meditation_norm
-                _apply_fade(side['intensity'], side['coords'], center, radius, multiplier)
+            for entry in surface['influence'].get(sensor_name, []):
+                radius = _coverage_radius(entry['span'], coverage_factor, entry['base_factor'])
+                multiplier = attention_norm if entry['metric'] == 'attention' else meditation_norm
+                _apply_fade(side_intensity[entry['side']], entry['order'], entry['distances'], radius, multiplier)
 
         return intensity_right, intensity_left
     
-    def create_live_brain_figure(self, all_sensors_data):
+    def create_live_brain_figure(self, all_sensors_data, lod=None):
         """
         Crear figura del cerebro con datos EEG en vivo de los sensores.
         
@@ -329,10 +327,10 @@ class BrainVisualizer:
         Retorna:
         - plotly.graph_objects.Figure: Visualización 3D del cerebro actualizada
         """
-        if not self._lazy_init():
+        if not self._lazy_init(lod):
             return self._create_fallback_figure()
             
-        intensity_right, intensity_left = self.update_brain_intensity(all_sensors_data)
+        intensity_right, intensity_left = self.update_brain_intensity(all_sensors_data, lod)
         
         # Determinar sufijo del título basado en los datos
         sensor_count = len([k for k in all_sensors_data.keys() if k != 'uid'])
@@ -342,9 +340,45 @@ class BrainVisualizer:
         else:
             title_suffix = f" - Todos los Sensores ({sensor_count})"
             
-        return self.create_brain_figure(intensity_right, intensity_left, title_suffix)
+        return self.create_brain_figure(intensity_right, intensity_left, title_suffix, lod)
     
-    def update_live_brain_intensity(self, all_sensors_data):
+    def client_tables(self, lod=None):
+        """
+        Tablas de influencia de un nivel de detalle para calcular la intensidad
+        en el navegador (brain_render_mode = "client").
+
+        Se mandan una sola vez por malla; después cada tick solo necesita
+        attention, meditation y signal_strength de cada sensor, que ya llegan
+        en el store memory.
+
+        Retorna:
+        - dict: Tablas serializables a JSON, o None si la malla no se pudo cargar
+        """
+        if not self._lazy_init(lod):
+            return None
+        surface = self._surface(lod)
+
+        sensors = {}
+        for sensor_name, entries in surface['influence'].items():
+            sensors[sensor_name] = [{
+                'side': entry['side'],
+                'metric': entry['metric'],
+                'base_factor': entry['base_factor'],
+                'span': entry['span'],
+                'order': typed_array(entry['order'], 'i4'),
+                # float32 basta para el radio y pesa la mitad
+                'distances': typed_array(entry['distances'], 'f4'),
+            } for entry in entries]
+
+        return {
+            'lod': lod or self.lod,
+            'sizes': {side: len(surface[side]['reference']) for side in ('right', 'left')},
+            # con intensidades cuantizadas el navegador debe usar la misma escala
+            'levels': levels(self.encoding) if ENCODINGS[self.encoding] is not None else None,
+            'sensors': sensors,
+        }
+
+    def update_live_brain_intensity(self, all_sensors_data, lod=None):
         """
         Actualizar solo la intensidad del cerebro para preservar la posición de la cámara.
         Retorna datos para actualización incremental sin recrear la figura.
@@ -353,22 +387,23 @@ class BrainVisualizer:
         - all_sensors_data: Diccionario con datos de sensores
         
         Retorna:
-        - dict: Datos de actualización para Plotly (formato extendData)
+        - dict: Datos de actualización para Plotly (formato extendData), con
+          las intensidades ya codificadas según self.encoding
         """
-        if not self._initialized:
+        if self._surface(lod) is None:
             return None
             
-        intensity_right, intensity_left = self.update_brain_intensity(all_sensors_data)
+        intensity_right, intensity_left = self.update_brain_intensity(all_sensors_data, lod)
         
         if intensity_right is None or intensity_left is None:
             return None
             
         # Retornar datos de actualización en formato para Plotly extendData/restyle
         return {
-            'intensity_right': intensity_right,
-            'intensity_left': intensity_left,
+            'intensity_right': encode_intensity(intensity_right, self.encoding),
+            'intensity_left': encode_intensity(intensity_left, self.encoding),
             'trace_indices': [0, 1]  # Índices de las trazas del hemisferio derecho e izquierdo
         }
 
 # Instancia global del visualizador de cerebro
-brain_viz = BrainVisualizer()
\ No newline at end of file
+brain_viz = BrainVisualizer(Utils.BRAIN_LOD, Utils.BRAIN_INTENSITY_ENCODING)
\ No newline at end of file
@@ -0,0 +1,137 @@
+"""
+Codificacion compacta de las intensidades por vertice del cerebro 3D.
+
+Las intensidades solo se dibujan entre INTENSITY_MIN e INTENSITY_MAX con una
+escala de color fija, asi que se pueden cuantizar a uint8 o uint16 sin que
+cambie el color visible. Se mandan como arreglos tipados de plotly
+({"dtype": "u1", "bdata": <base64>}), que plotly.js decodifica directamente
+en el navegador, en lugar de listas JSON de float64.
+
+Ejecutar `python -m src.py.brain_viz.intensity_encoding` compara bytes y
+tiempo de serializacion de cada codificacion contra la figura completa.
+"""
+
+import base64
+
+import numpy as np
+
+INTENSITY_MIN = -6.0
+INTENSITY_MAX = 6.0
+
+# "float" manda los valores tal cual; "u1" y "u2" los cuantizan
+ENCODINGS = {
+    "float": None,
+    "u1": np.dtype("<u1"),
+    "u2": np.dtype("<u2"),
+}
+
+# Valores de la barra de color, en unidades de intensidad
+COLORBAR_TICKS = (-6, -3, 0, 3, 6)
+
+
+def levels(encoding:str) -> int:
+    '''
+    valor cuantizado maximo de la codificacion (255 para u1, 65535 para u2)
+    '''
+    return int(np.iinfo(ENCODINGS[encoding]).max)
+
+
+def quantize(values:np.ndarray, encoding:str = "u1") -> np.ndarray:
+    '''
+    lleva las intensidades de [INTENSITY_MIN, INTENSITY_MAX] a enteros de
+    0 a levels(encoding), los valores fuera del rango se recortan
+    '''
+    top = levels(encoding)
+    scaled = (np.asarray(values, dtype=np.float64) - INTENSITY_MIN) * (top / (INTENSITY_MAX - INTENSITY_MIN))
+    return np.rint(np.clip(scaled, 0, top)).astype(ENCODINGS[encoding])
+
+
+def dequantize(values:np.ndarray, encoding:str = "u1") -> np.ndarray:
+    '''
+    inverso de quantize, para comprobar el error de la cuantizacion
+    '''
+    top = levels(encoding)
+    return np.asarray(values, dtype=np.float64) * ((INTENSITY_MAX - INTENSITY_MIN) / top) + INTENSITY_MIN
+
+
+def typed_array(values:np.ndarray, dtype:str) -> dict:
+    '''
+    empaqueta un arreglo en el formato de arreglo tipado de plotly
+    ({"dtype": "f4", "bdata": <base64>}), dtype es el codigo corto de numpy
+    (u1, u2, i4, f4, f8...)
+    '''
+    # plotly.js espera los arreglos tipados en little-endian
+    data = np.ascontiguousarray(values, dtype=np.dtype(dtype).newbyteorder("<"))
+    return {"dtype": dtype, "bdata": base64.b64encode(data.tobytes()).decode("ascii")}
+
+
+def encode_intensity(values:np.ndarray, encoding:str = "u1"):
+    '''
+    devuelve las intensidades listas para mandar en la figura o en un Patch:
+    el arreglo original con "float", o un arreglo tipado de plotly en base64
+    '''
+    if encoding not in ENCODINGS:
+        raise ValueError(f"codificacion de intensidad desconocida: {encoding}")
+    if ENCODINGS[encoding] is None:
+        return values
+    return typed_array(quantize(values, encoding), encoding)
+
+
+def color_range(encoding:str = "u1") -> dict:
+    '''
+    cmin, cmax y marcas de la barra de color que corresponden a la
+    codificacion, para que los colores y las etiquetas sigan en [-6, 6]
+    '''
+    if ENCODINGS[encoding] is None:
+        return {"cmin": INTENSITY_MIN, "cmax": INTENSITY_MAX, "tickvals": None, "ticktext": None}
+    return {
+        "cmin": 0,
+        "cmax": levels(encoding),
+        "tickvals": quantize(COLORBAR_TICKS, encoding).tolist(),
+        "ticktext": [str(tick) for tick in COLORBAR_TICKS],
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    import plotly.io.json as pio_json
+    from dash import Patch
+
+    from src.py.brain_viz.brain_visualizer import BrainVisualizer
+
+    parser = argparse.ArgumentParser(description="Compara las codificaciones de intensidad del cerebro 3D")
+    parser.add_argument("--mesh", default="fsaverage5", help="malla de nilearn del paquete de brain_cache")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    sensors_data = {"uid": 0}
+    for name in ("sensor_a", "sensor_b", "sensor_c", "sensor_d", "sensor_e"):
+        sensors_data[name] = {metric: rng.uniform(0, 100) for metric in ("attention", "meditation", "signal_strength")}
+
+    def measure(build):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            payload = pio_json.to_json_plotly(build())
+        return len(payload), (time.perf_counter() - start) / args.repeat * 1000
+
+    print(f"{'codificacion':>12} {'figura KB':>10} {'figura ms':>10} {'patch KB':>9} {'patch ms':>9} {'error max':>10}")
+    for encoding in ENCODINGS:
+        visualizer = BrainVisualizer(args.mesh, encoding=encoding)
+        if not visualizer._lazy_init():
+            raise SystemExit(f"no se pudo cargar la malla {args.mesh}")
+        right, left = visualizer.update_brain_intensity(sensors_data)
+
+        def build_patch():
+            patch = Patch()
+            update = visualizer.update_live_brain_intensity(sensors_data)
+            patch["data"][0]["intensity"] = update["intensity_right"]
+            patch["data"][1]["intensity"] = update["intensity_left"]
+            return patch.to_plotly_json()
+
+        figure_bytes, figure_ms = measure(lambda: visualizer.create_live_brain_figure(sensors_data))
+        patch_bytes, patch_ms = measure(build_patch)
+        error = 0.0 if ENCODINGS[encoding] is None else float(np.abs(dequantize(quantize(right, encoding), encoding) - np.clip(right, INTENSITY_MIN, INTENSITY_MAX)).max())
+        print(f"{encoding:>12} {figure_bytes / 1024:>10.1f} {figure_ms:>10.2f} {patch_bytes / 1024:>9.1f} {patch_ms:>9.2f} {error:>10.4f}")
@@ -1,125 +1,269 @@
 """Callbacks centralizados para la visualización en vivo del cerebro 3D."""
 
-import time
-
 import plotly.graph_objects as go
-from dash import Input, Output, State, ctx, no_update
+from dash import Input, Output, Patch, State, ctx, no_update
 
+from src.py.brain_viz.brain_components import BRAIN_TAB_ID
 from src.py.brain_viz.brain_visualizer import brain_viz
 from src.py.brain_viz.simple_timeline_callbacks import register_simple_timeline_callbacks
+from src.py.utils.utils import Utils
 
 
 _INTERACTION_DEFAULT = {"is_interacting": False, "last_interaction": 0.0}
-_PAUSE_TRIGGER_IDS = {"timer", "memory"}
-
-
-def register_brain_callbacks(app):
-    """Registrar callbacks del cerebro con la aplicación Dash."""
-
-    register_simple_timeline_callbacks(app)
-
-    app.clientside_callback(
-        """
-        function(n_intervals) {
-            try {
-                if (typeof window.mouseTracker === 'undefined') {
-                    window.mouseTracker = { isPressed: false, lastUpdate: 0 };
-
-                    document.addEventListener('mousedown', function (event) {
-                        const graphContainer = document.getElementById('brain_graph');
-                        if (graphContainer && graphContainer.contains(event.target)) {
-                            window.mouseTracker.isPressed = true;
-                            window.mouseTracker.lastUpdate = Date.now() / 1000;
-                        }
-                    });
-
-                    document.addEventListener('mouseup', function () {
-                        if (window.mouseTracker.isPressed) {
-                            window.mouseTracker.isPressed = false;
-                            window.mouseTracker.lastUpdate = Date.now() / 1000;
-                        }
-                    });
-                }
-
-                return {
-                    is_interacting: window.mouseTracker.isPressed,
-                    last_interaction: window.mouseTracker.lastUpdate
-                };
-            } catch (error) {
-                console.error('Mouse tracker error:', error);
-                return { is_interacting: false, last_interaction: 0 };
-            }
+_PAUSE_TRIGGER_IDS = {"brain_memory", "brain_rebuild_request"}
+# Cambios que obligan a mandar la malla completa otra vez
+_REBUILD_TRIGGER_IDS = {"sensor_select", "quantity_select", "brain_lod_select"}
+_BASE_TITLE = "Visualización Cerebro 3D"
+# En modo "client" el navegador recalcula la intensidad en cada tick de brain_memory
+_CLIENT_RENDER = Utils.BRAIN_RENDER_MODE == "client"
+
+# Replica update_brain_intensity con las tablas de client_tables: para cada
+# sensor corta la tabla de distancias ordenadas en el radio de cobertura y
+# suma el desvanecimiento, luego aplica Plotly.restyle sobre la malla dibujada.
+# Es lo único que corre en cada tick; si todavía no hay malla devuelve la
+# muestra en brain_rebuild_request para que el servidor la mande
+_CLIENT_INTENSITY_JS = """
+function(memoryData, selectedSensor, quantityMode, timelineState, interactionState, tables, renderState) {
+    const noUpdate = window.dash_clientside.no_update;
+    if (!memoryData || memoryData.uid === undefined) {
+        return noUpdate;
+    }
+    if ((timelineState && timelineState.mode && timelineState.mode !== 'live') ||
+        (interactionState && interactionState.is_interacting)) {
+        return noUpdate;
+    }
+    if (!renderState || !renderState.mesh) {
+        return memoryData;
+    }
+    // las tablas de la malla dibujada siguen en camino
+    if (!tables || renderState.lod !== tables.lod) {
+        return noUpdate;
+    }
+    const graph = document.querySelector('#brain_graph .js-plotly-plot');
+    if (!graph || !window.Plotly) {
+        return noUpdate;
+    }
+
+    const decode = function (packed) {
+        const bytes = Uint8Array.from(atob(packed.bdata), function (c) { return c.charCodeAt(0); });
+        return packed.dtype === 'i4' ? new Int32Array(bytes.buffer) : new Float32Array(bytes.buffer);
+    };
+    // las tablas se decodifican una vez por malla
+    if (!window.brainTables || window.brainTables.lod !== tables.lod) {
+        const sensors = {};
+        Object.keys(tables.sensors).forEach(function (name) {
+            sensors[name] = tables.sensors[name].map(function (entry) {
+                return Object.assign({}, entry, { order: decode(entry.order), distances: decode(entry.distances) });
+            });
+        });
+        window.brainTables = { lod: tables.lod, sensors: sensors };
+    }
+
+    const intensity = {
+        right: new Float64Array(tables.sizes.right),
+        left: new Float64Array(tables.sizes.left)
+    };
+    const normalize = function (value) { return (value - 50) * 6 / 50; };
+    const names = quantityMode === 'todos' ? Object.keys(memoryData) : [selectedSensor];
+
+    names.forEach(function (name) {
+        const sensor = memoryData[name];
+        const entries = window.brainTables.sensors[name];
+        if (name === 'uid' || !sensor || !entries) {
+            return;
         }
+        const pick = function (key) { return sensor[key] === undefined ? 50 : sensor[key]; };
+        const metrics = { attention: normalize(pick('attention')), meditation: normalize(pick('meditation')) };
+        const coverage = (pick('signal_strength') / 100.0) * 0.9 + 0.1;
+
+        entries.forEach(function (entry) {
+            const radius = entry.span * entry.base_factor * coverage;
+            if (radius <= 0) {
+                return;
+            }
+            const distances = entry.distances;
+            // las distancias están ordenadas: búsqueda binaria del prefijo dentro del radio
+            let low = 0, high = distances.length;
+            while (low < high) {
+                const mid = (low + high) >> 1;
+                if (distances[mid] <= radius) { low = mid + 1; } else { high = mid; }
+            }
+            const target = intensity[entry.side];
+            const multiplier = metrics[entry.metric];
+            for (let i = 0; i < low; i++) {
+                target[entry.order[i]] += (1 - distances[i] / radius) * multiplier;
+            }
+        });
+    });
+
+    if (tables.levels) {
+        // misma cuantización que intensity_encoding.quantize
+        ['right', 'left'].forEach(function (side) {
+            const values = intensity[side];
+            for (let i = 0; i < values.length; i++) {
+                values[i] = Math.round(Math.min(Math.max((values[i] + 6) * tables.levels / 12, 0), tables.levels));
+            }
+        });
+    }
+
+    window.Plotly.restyle(graph, { intensity: [intensity.right, intensity.left] }, [0, 1]);
+    return noUpdate;
+}
+"""
+
+
+# Milisegundos sin interacción antes de reanudar las actualizaciones del cerebro
+_RELEASE_MS = 2000
+
+_INTERACTION_JS = """
+function(relayoutData) {
+    const noUpdate = window.dash_clientside.no_update;
+    const tracker = window.brainInteraction = window.brainInteraction || { installed: false, pressed: false, timer: null };
+    const publish = function (isInteracting) {
+        window.dash_clientside.set_props('brain_interaction_store', {
+            data: { is_interacting: isInteracting, last_interaction: Date.now() / 1000 }
+        });
+    };
+    const releaseLater = function () {
+        clearTimeout(tracker.timer);
+        tracker.timer = setTimeout(function () { publish(false); }, %d);
+    };
+
+    if (!tracker.installed) {
+        tracker.installed = true;
+        document.addEventListener('mousedown', function (event) {
+            const graphContainer = document.getElementById('brain_graph');
+            if (graphContainer && graphContainer.contains(event.target)) {
+                clearTimeout(tracker.timer);
+                tracker.pressed = true;
+                publish(true);
+            }
+        });
+        document.addEventListener('mouseup', function () {
+            if (tracker.pressed) {
+                tracker.pressed = false;
+                releaseLater();
+            }
+        });
+        return noUpdate;
+    }
+
+    if (!relayoutData) {
+        return noUpdate;
+    }
+    // zoom con la rueda o cambios de cámara sin arrastrar
+    if (!tracker.pressed) {
+        releaseLater();
+    }
+    return { is_interacting: true, last_interaction: Date.now() / 1000 };
+}
+""" % _RELEASE_MS
+
+
+def register_brain_callbacks(app, tabs_id=None, db=None):
+    """
+    Registrar callbacks del cerebro con la aplicación Dash.
+
+    Con tabs_id (el id de las pestañas que contienen la del cerebro) los ticks
+    de memory solo llegan al cerebro mientras su pestaña está visible; así una
+    pestaña oculta no hace ninguna petición al servidor. Con db el timeline
+    puede volver a cualquier momento de la sesión grabada.
+    """
+
+    register_simple_timeline_callbacks(app, db)
+
+    # activeTab es undefined cuando no hay tabs_id: entonces pasa todo
+    app.clientside_callback(
+        f"""
+        function(memoryData, activeTab) {{
+            if (activeTab !== undefined && activeTab !== '{BRAIN_TAB_ID}') {{
+                return window.dash_clientside.no_update;
+            }}
+            return memoryData;
+        }}
         """,
-        Output("brain_interaction_store", "data", allow_duplicate=True),
-        Input("interaction_timer", "n_intervals"),
-        prevent_initial_call=True,
+        Output("brain_memory", "data"),
+        Input("memory", "data"),
+        *([Input(tabs_id, "active_tab")] if tabs_id is not None else []),
     )
 
-    @app.callback(
-        Output("brain_interaction_store", "data", allow_duplicate=True),
+    # Sin timers: los eventos del mouse y relayoutData marcan la interacción y
+    # un setTimeout la libera _RELEASE_MS después del último movimiento
+    app.clientside_callback(
+        _INTERACTION_JS,
+        Output("brain_interaction_store", "data"),
         Input("brain_graph", "relayoutData"),
-        Input("interaction_timer", "n_intervals"),
-        State("brain_interaction_store", "data"),
-        prevent_initial_call=True,
     )
-    def detect_interaction(relayout_data, _interval, interaction_state):
-        state = _merge_interaction_state(interaction_state)
-        triggered_id = ctx.triggered_id if ctx.triggered else None
-        now = time.time()
-
-        if triggered_id == "brain_graph" and relayout_data:
-            return {"is_interacting": True, "last_interaction": now}
-
-        if triggered_id == "interaction_timer" and state["is_interacting"]:
-            if now - state["last_interaction"] > 2.0:
-                return {"is_interacting": False, "last_interaction": state["last_interaction"]}
 
-        return state
+    if _CLIENT_RENDER:
+        _register_client_render(app)
 
+    # En modo "client" los ticks no llegan al servidor: solo brain_rebuild_request,
+    # que el navegador escribe cuando falta la malla, y la muestra más reciente como State
     @app.callback(
         Output("brain_graph", "figure"),
         Output("brain_camera_store", "data"),
-        Input("timer", "n_intervals"),
-        Input("memory", "data"),
+        Output("brain_render_state", "data"),
+        Input("brain_rebuild_request" if _CLIENT_RENDER else "brain_memory", "data"),
         Input("sensor_select", "value"),
         Input("quantity_select", "value"),
         Input("simple_timeline_mode", "data"),
+        Input("brain_lod_select", "value"),
         State("brain_camera_store", "data"),
         State("brain_interaction_store", "data"),
+        State("brain_render_state", "data"),
+        *([State("brain_memory", "data")] if _CLIENT_RENDER else []),
     )
-    def update_brain_visualization(_, memory_data, selected_sensor, quantity_mode, timeline_state, camera_state, interaction_state):
+    def update_brain_visualization(memory_data, selected_sensor, quantity_mode, timeline_state, lod, camera_state, interaction_state, render_state, latest_memory=None):
+        """
+        Mandar la malla completa solo cuando hace falta (primera vez o cambio de
+        sensor/modo/nivel de detalle) y en los demás ticks solo las intensidades
+        con un Patch.
+        """
+        memory_data = latest_memory or memory_data
         triggered_id = ctx.triggered_id if ctx.triggered else None
         timeline_state = timeline_state or {}
         timeline_mode = timeline_state.get("mode", "live")
         interaction_state = _merge_interaction_state(interaction_state)
+        lod = lod or brain_viz.lod
+        render_state = render_state or {}
+        # un Patch solo sirve si la malla dibujada es la del nivel de detalle pedido
+        has_mesh = bool(render_state.get("mesh")) and render_state.get("lod", brain_viz.lod) == lod
 
         if interaction_state["is_interacting"] and triggered_id in _PAUSE_TRIGGER_IDS and timeline_mode == "live":
-            return no_update, camera_state
+            return no_update, camera_state, no_update
 
         if timeline_mode in {"paused", "historical"} and triggered_id in _PAUSE_TRIGGER_IDS:
-            return no_update, camera_state
+            return no_update, camera_state, no_update
 
         active_data = timeline_state.get("selected_data") if timeline_mode == "historical" else memory_data
         if not active_data or "uid" not in active_data:
-            return _build_message_figure("Esperando datos de la sesión..."), camera_state
+            return _build_message_figure("Esperando datos de la sesión..."), camera_state, {"mesh": False}
 
         sensors_data = _build_sensor_payload(active_data, quantity_mode, selected_sensor)
         if sensors_data is None:
-            return _build_message_figure(f"No hay datos para: {selected_sensor}"), camera_state
+            return _build_message_figure(f"No hay datos para: {selected_sensor}"), camera_state, {"mesh": False}
 
         if len(sensors_data) <= 1:
-            return _build_message_figure("No hay datos de sensores disponibles"), camera_state
+            return _build_message_figure("No hay datos de sensores disponibles"), camera_state, {"mesh": False}
+
+        title = _timeline_title(timeline_mode, timeline_state.get("selected_time"))
+
+        if has_mesh and triggered_id not in _REBUILD_TRIGGER_IDS:
+            patch = _build_intensity_patch(sensors_data, title, lod)
+            if patch is not None:
+                # uirevision conserva la cámara, no hace falta reenviarla
+                return patch, no_update, no_update
 
-        figure = brain_viz.create_live_brain_figure(sensors_data)
-        _apply_timeline_title(figure, timeline_mode, timeline_state.get("selected_time"))
+        figure = brain_viz.create_live_brain_figure(sensors_data, lod)
+        figure.update_layout(title=title)
 
         camera_settings = _extract_camera(camera_state)
         if camera_settings:
             figure.update_layout(scene=dict(camera=camera_settings))
 
         normalized_camera = _pack_camera(camera_settings) if camera_settings else camera_state
-        return figure, normalized_camera
+        return figure, normalized_camera, {"mesh": bool(figure.data), "lod": lod}
 
     @app.callback(
         Output("brain_camera_store", "data", allow_duplicate=True),
@@ -141,6 +285,30 @@ def register_brain_callbacks(app):
         return current_state
 
 
+def _register_client_render(app):
+    """Mandar las tablas de influencia una vez por malla y recalcular la intensidad en el navegador."""
+
+    @app.callback(
+        Output("brain_influence_tables", "data"),
+        Input("brain_lod_select", "value"),
+    )
+    def send_influence_tables(lod):
+        return brain_viz.client_tables(lod or brain_viz.lod)
+
+    app.clientside_callback(
+        _CLIENT_INTENSITY_JS,
+        Output("brain_rebuild_request", "data"),
+        Input("brain_memory", "data"),
+        State("sensor_select", "value"),
+        State("quantity_select", "value"),
+        State("simple_timeline_mode", "data"),
+        State("brain_interaction_store", "data"),
+        State("brain_influence_tables", "data"),
+        State("brain_render_state", "data"),
+        prevent_initial_call=True,
+    )
+
+
 def _merge_interaction_state(state):
     return {**_INTERACTION_DEFAULT, **(state or {})}
 
@@ -163,18 +331,24 @@ def _build_sensor_payload(data, quantity_mode, selected_sensor):
     return payload
 
 
-def _apply_timeline_title(figure, timeline_mode, selected_time):
-    if not figure.layout.title:
-        figure.update_layout(title="Visualización Cerebro 3D")
+def _build_intensity_patch(sensors_data, title, lod=None):
+    intensity_update = brain_viz.update_live_brain_intensity(sensors_data, lod)
+    if not intensity_update:
+        return None
+
+    patch = Patch()
+    patch["data"][0]["intensity"] = intensity_update["intensity_right"]
+    patch["data"][1]["intensity"] = intensity_update["intensity_left"]
+    patch["layout"]["title"] = {"text": title}
+    return patch
 
-    base_title = figure.layout.title.text or "Visualización Cerebro 3D"
-    if isinstance(base_title, str):
-        base_title = base_title.split("<br><span")[0]
 
+def _timeline_title(timeline_mode, selected_time):
     if timeline_mode == "historical" and selected_time is not None:
-        figure.update_layout(title=f"{base_title}<br><span style='color: orange; font-size: 12px;'>🕒 Modo Histórico: t={selected_time:.1f}s</span>")
-    elif timeline_mode == "paused":
-        figure.update_layout(title=f"{base_title}<br><span style='color: gray; font-size: 12px;'>⏸️ Pausado</span>")
+        return f"{_BASE_TITLE}<br><span style='color: orange; font-size: 12px;'>🕒 Modo Histórico: t={selected_time:.1f}s</span>"
+    if timeline_mode == "paused":
+        return f"{_BASE_TITLE}<br><span style='color: gray; font-size: 12px;'>⏸️ Pausado</span>"
+    return _BASE_TITLE
 
 
 def _build_message_figure(message):
@@ -112,7 +112,7 @@ def create_simple_timeline():
         ], width=8),
         dbc.Col([
             html.Small(
-                "💡 Haz click en cualquier punto para navegar en el tiempo",
+                "💡 Haz click o arrastra la barra para navegar en el tiempo",
                 className="text-muted fst-italic"
             )
         ], width=4, className="d-flex align-items-center justify-content-end")
@@ -121,14 +121,11 @@ def create_simple_timeline():
     # Componente completo
     timeline_component = html.Div([
         # Stores para datos
+        # El historial vive en el servidor (acquisition.history), aquí solo el uid
         dcc.Store(id='simple_session_data', data={
-            'timestamps': [],
-            'attention': [],
-            'meditation': [],
-            'signal_strength': [],
-            'full_history': [],
-            'session_start': None,
-            'max_points': 120  # 2 minutos de datos
+            'uid': None,
+            'samples': 0,
+            'seconds': None
         }),
         dcc.Store(id='simple_timeline_mode', data={
             'mode': 'live',  # 'live', 'paused', 'historical'
@@ -148,6 +145,20 @@ def create_simple_timeline():
                 'showTips': True
             },
             style={'border': '1px solid #dee2e6', 'border-radius': '8px'}
+        ),
+
+        # Recorre toda la sesión; lo anterior al historial en memoria se lee de la base
+        html.Div(
+            dcc.Slider(
+                id='simple_timeline_scrubber',
+                min=0,
+                max=0,
+                value=None,
+                marks=None,
+                updatemode='mouseup',
+                tooltip={'placement': 'bottom', 'always_visible': False}
+            ),
+            className="mt-2"
         )
     ], style={
         'padding': '15px',
@@ -1,97 +1,109 @@
 """Callbacks simplificados para el timeline reducido del cerebro 3D."""
 
-import time
-
+import numpy as np
 import plotly.graph_objects as go
 from dash import Input, Output, State, ctx, no_update
 
-def register_simple_timeline_callbacks(app):
-    """Registrar callbacks del timeline simplificado."""
+from src.py.acquisition.history import get_history
+from src.py.database.scrubber import SessionScrubber
+
+# Puntos que se conservan al extender el timeline (1 minuto a 1 muestra por segundo)
+TIMELINE_WINDOW = 60
+
+# Parametros que se grafican en el timeline, en el orden de sus trazas
+TIMELINE_PARAMS = ('attention', 'meditation', 'signal_strength')
+
+def register_simple_timeline_callbacks(app, db=None):
+    """
+    Registrar callbacks del timeline simplificado.
+
+    Con db el scrubber y los clicks pueden ir a cualquier momento de la
+    sesión: lo que ya no está en el historial en memoria se lee de la base.
+    """
+    scrubber = SessionScrubber(db) if db is not None else None
 
+    # brain_memory solo cambia mientras la pestaña del cerebro está visible
+    # (ver register_brain_callbacks), así el timeline oculto no hace peticiones
     @app.callback(
-        Output('simple_session_data', 'data'),
-        Input('memory', 'data'),
-        [State('simple_session_data', 'data'),
-         State('simple_timeline_mode', 'data')],
+        [Output('simple_session_data', 'data'),
+         Output('simple_timeline_graph', 'extendData'),
+         Output('simple_timeline_scrubber', 'max')],
+        Input('brain_memory', 'data'),
+        State('simple_timeline_mode', 'data'),
+        State('simple_session_data', 'data'),
         prevent_initial_call=True
     )
-    def update_session_data(memory_data, session_data, mode_data):
-        """Actualizar los datos de la sesión actual."""
-        triggered_id = ctx.triggered_id if ctx.triggered else None
-
+    def update_session_data(memory_data, mode_data, session_data):
+        """
+        Extender el timeline con las muestras del historial del servidor que
+        todavía no se dibujaron (orden de las trazas: attention, meditation,
+        signal); al volver a la pestaña se agregan las que pasaron mientras
+        estaba oculta. El store solo guarda el uid, cuántas muestras hay y el
+        tiempo de la última dibujada, no el historial.
+        """
         if not memory_data or 'uid' not in memory_data:
-            return session_data
+            return no_update, no_update, no_update
 
         if mode_data and mode_data.get('mode') != 'live':
-            return session_data
+            return no_update, no_update, no_update
 
-        session_data = session_data or _fresh_session_state()
-        if not session_data.get('session_start'):
-            session_data['session_start'] = time.time()
+        history = get_history(memory_data['uid'])
+        if history is None or len(history) == 0:
+            return no_update, no_update, no_update
 
-        _append_session_point(session_data, memory_data)
-        _trim_session_history(session_data)
-        return session_data
+        times = history.times()
+        last_seconds = (session_data or {}).get('seconds')
+        # sin punto previo, o si el historial volvió a empezar (saltar atrás en una repetición)
+        if last_seconds is None or last_seconds > times[-1]:
+            first = 0
+        else:
+            first = int(np.searchsorted(times, last_seconds, side='right'))
+        # el timeline solo muestra los últimos TIMELINE_WINDOW puntos
+        positions = range(max(first, len(times) - TIMELINE_WINDOW), len(times))
+        if len(positions) == 0:
+            return no_update, no_update, no_update
 
-    @app.callback(
-        Output('simple_timeline_graph', 'extendData'),
-        [Input('simple_session_data', 'data')],
-        [State('simple_timeline_mode', 'data')],
-        prevent_initial_call=True
-    )
-    def update_timeline_graph(session_data, mode_data):
-        """Actualizar gráfico del timeline usando extendData."""
-        
-        if not session_data or not session_data.get('timestamps'):
-            return no_update
-        
-        if mode_data and mode_data.get('mode') != 'live':
-            return no_update
-        
-        if len(session_data['timestamps']) == 0:
-            return no_update
-            
-        last_time = session_data['timestamps'][-1]
-        last_attention = session_data['attention'][-1]
-        last_meditation = session_data['meditation'][-1]
-        last_signal = session_data['signal_strength'][-1]
-        
-        # Retornar datos para extender (orden: attention, meditation, signal)
+        averages = [history.averages(TIMELINE_PARAMS, position) for position in positions]
         extend_data = {
-            'x': [[last_time], [last_time], [last_time]],
-            'y': [[last_attention], [last_meditation], [last_signal]]
+            'x': [[float(times[position]) for position in positions]] * len(TIMELINE_PARAMS),
+            'y': [[values[i] for values in averages] for i in range(len(TIMELINE_PARAMS))]
         }
-        
-        # Limitar cantidad de puntos visibles (últimos 60 puntos = 1 minuto)
-        trace_indices = [0, 1, 2]
-        max_visible = 60
-        
-        return [extend_data, trace_indices, max_visible]
+
+        seconds = float(times[-1])
+        session_data = {'uid': memory_data['uid'], 'samples': len(history), 'seconds': seconds}
+        return session_data, [extend_data, list(range(len(TIMELINE_PARAMS))), TIMELINE_WINDOW], seconds
     
     @app.callback(
         [Output('simple_timeline_mode', 'data'),
          Output('simple_timeline_status_badge', 'children'),
          Output('simple_timeline_status_badge', 'color')],
         Input('simple_timeline_graph', 'clickData'),
+        Input('simple_timeline_scrubber', 'value'),
         Input('simple_timeline_pause_btn', 'n_clicks'),
         Input('simple_timeline_resume_btn', 'n_clicks'),
         State('simple_timeline_mode', 'data'),
         State('simple_session_data', 'data'),
         prevent_initial_call=True
     )
-    def handle_timeline_controls(click_data, pause_clicks, resume_clicks,
+    def handle_timeline_controls(click_data, scrubber_value, pause_clicks, resume_clicks,
                                 mode_data, session_data):
-        """Manejar clicks en el timeline y botones de control."""
+        """Manejar clicks en el timeline, el scrubber y botones de control."""
         
         triggered_id = ctx.triggered_id if ctx.triggered else None
 
         mode_data = mode_data or _default_timeline_mode()
         new_mode = mode_data.copy()
 
+        selected_time = None
         if triggered_id == 'simple_timeline_graph' and click_data:
             selected_time = click_data['points'][0]['x']
-            selected_data = _select_history_point(session_data, selected_time)
-            new_mode.update({'mode': 'historical', 'selected_time': selected_time, 'selected_data': selected_data})
+        elif triggered_id == 'simple_timeline_scrubber' and scrubber_value is not None:
+            selected_time = scrubber_value
+
+        if selected_time is not None:
+            selected_sample, selected_data = _select_history_point(session_data, selected_time, scrubber)
+            new_mode.update({'mode': 'historical', 'selected_time': selected_time,
+                             'selected_sample': selected_sample, 'selected_data': selected_data})
             status_text = f"🕒 HISTÓRICO: {selected_time:.1f}s"
             status_color = "warning"
 
@@ -139,63 +151,25 @@ def register_simple_timeline_callbacks(app):
         return fig
 
 
-def _fresh_session_state():
-    return {
-        'timestamps': [],
-        'attention': [],
-        'meditation': [],
-        'signal_strength': [],
-        'full_history': [],
-        'session_start': time.time(),
-        'max_points': 120
-    }
-
-
-def _append_session_point(session_data, memory_data):
-    current_time = time.time() - session_data['session_start']
-    attention, meditation, signal = _average_metrics(memory_data)
-
-    session_data['timestamps'].append(current_time)
-    session_data['attention'].append(attention)
-    session_data['meditation'].append(meditation)
-    session_data['signal_strength'].append(signal)
-    session_data['full_history'].append(memory_data.copy())
-
-
-def _average_metrics(memory_data):
-    attentions, meditations, signals = [], [], []
-    for sensor_key, sensor_data in memory_data.items():
-        if sensor_key == 'uid' or not sensor_data:
-            continue
-        attentions.append(sensor_data.get('attention', 0))
-        meditations.append(sensor_data.get('meditation', 0))
-        signals.append(sensor_data.get('signal_strength', 0))
-
-    avg = lambda items: sum(items) / len(items) if items else 0
-    return avg(attentions), avg(meditations), avg(signals)
-
-
-def _trim_session_history(session_data):
-    max_points = session_data.get('max_points', 120)
-    excess = len(session_data['timestamps']) - max_points
-    if excess <= 0:
-        return
-
-    for key in ('timestamps', 'attention', 'meditation', 'signal_strength', 'full_history'):
-        session_data[key] = session_data[key][-max_points:]
-
-
 def _default_timeline_mode():
     return {'mode': 'live', 'selected_time': None, 'selected_data': None}
 
 
-def _select_history_point(session_data, selected_time):
-    if not session_data or not session_data.get('timestamps'):
-        return None
+def _select_history_point(session_data, selected_time, scrubber=None):
+    """
+    Devuelve (sample, muestra en formato memory) más cercana a selected_time:
+    del historial en memoria si lo cubre, si no de la base con el scrubber.
+    """
+    uid = (session_data or {}).get('uid')
+    history = get_history(uid)
+    if history is not None and len(history) and selected_time >= history.times()[0]:
+        sample, _, memory = history.at(history.nearest(selected_time))
+        return sample, memory
+
+    if scrubber is not None and uid is not None:
+        return scrubber.sample_at(uid, selected_time)
 
-    timestamps = session_data['timestamps']
-    index = min(range(len(timestamps)), key=lambda i: abs(timestamps[i] - selected_time))
-    return session_data['full_history'][index]
+    return None, None
 
 
 def _status_badge(mode_data):
@@ -1,22 +1,287 @@
 import numpy as np
 import sqlite3
-from contextlib import closing
+from contextlib import closing, contextmanager
+import os
+import pathlib
+import queue
 import re
+import threading
+import time
 import pandas as pd
 from src.py.utils.utils import get_date
+from src.py.database.rollups import ROLLUP_SCHEMA, UPSERT_ROLLUP, aggregate
 
 sqlite3.register_adapter(np.int32, lambda val: int(val))
 sqlite3.register_adapter(np.int64, lambda val: int(val))
 
+# Pragmas de la conexion de escritura: WAL permite leer mientras se escribe y
+# synchronous=NORMAL solo hace fsync en los checkpoints, no en cada commit
+WRITER_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+READER_PRAGMAS = (
+    "PRAGMA cache_size=-8000",
+)
+
+# Formas de guardar las muestras de una sesion:
+# WIDE una tabla session_{uid} con una columna por sensor y parametro
+# LONG una fila (session, sensor, param, sample, value) por valor en la tabla
+# samples, comun a todas las sesiones; agregar sensores no cambia el esquema
+WIDE = "wide"
+LONG = "long"
+LEGACY = "legacy"
+
+# Las sesiones antiguas se leen por posicion y su indice se desplaza por esto
+LEGACY_OFFSET = 2
+
+LONG_SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS "long_channels" (
+        "session"	INTEGER NOT NULL,
+        "sensor"	INTEGER NOT NULL,
+        "param"	INTEGER NOT NULL,
+        "name"	TEXT NOT NULL,
+        PRIMARY KEY("session","sensor","param")
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS "samples" (
+        "session"	INTEGER NOT NULL,
+        "sensor"	INTEGER NOT NULL,
+        "param"	INTEGER NOT NULL,
+        "sample"	INTEGER NOT NULL,
+        "value"	REAL,
+        PRIMARY KEY("session","sensor","param","sample")
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS "sample_times" (
+        "session"	INTEGER NOT NULL,
+        "sample"	INTEGER NOT NULL,
+        "time"	REAL NOT NULL,
+        PRIMARY KEY("session","sample")
+    ) WITHOUT ROWID
+    ''',
+    'CREATE INDEX IF NOT EXISTS "sample_times_time" ON "sample_times"("session","time")',
+)
+
 class Database:
 
-    def __init__(self, db:str) -> None:
+    def __init__(self, db:str, read_pool_size:int = 4, flush_rows:int = 100,
+                 flush_interval:float = 0.5, max_pending:int = 10000, layout:str = WIDE) -> None:
         '''
-        crea una conexion con la base de datos al crear un objeto del tipo
-        Registra otros tipos de datos para guardar en la base de datos, hay
-        que ver que datos se van a guardar manualmente
+        guarda la ruta de la base de datos, las conexiones se abren la primera
+        vez que se necesitan y se reutilizan hasta llamar a close:
+
+        una sola conexion de escritura (protegida con un lock para poder
+        usarla desde varios hilos) y hasta read_pool_size conexiones de solo
+        lectura para las consultas
+
+        record_data no escribe directamente, encola las filas y un hilo las
+        guarda en una sola transaccion cada flush_rows filas o cada
+        flush_interval segundos; si hay max_pending filas sin guardar,
+        record_data se bloquea hasta que haya espacio
+
+        layout (WIDE o LONG) es la forma en que se guardan las sesiones nuevas,
+        las sesiones existentes se leen en la forma con la que se grabaron
         '''
         self.db = db
+        self.layout = layout
+        self._read_pool_size = read_pool_size
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._flusher = None
+        self._flusher_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pool_lock = threading.Lock()
+        self._writer = None
+        self._readers = queue.LifoQueue()
+        self._all_readers = []
+        # columnas de cada tabla session_{uid}, el esquema no cambia una vez creado
+        self._session_columns = {}
+        self._session_layouts = {}
+        self._long_channels = {}
+        self._next_sample = {}
+        # filas que el hilo de escritura no pudo guardar y el ultimo error, se
+        # reportan en la siguiente llamada a record_data o flush
+        self.write_errors = 0
+        self._write_error = None
+
+    def _writer_connection(self) -> sqlite3.Connection:
+        if self._writer is None:
+            self._writer = sqlite3.connect(self.db, check_same_thread=False, timeout=5)
+            for pragma in WRITER_PRAGMAS:
+                self._writer.execute(pragma)
+        return self._writer
+
+    def _reader_connection(self) -> sqlite3.Connection:
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._pool_lock:
+            if len(self._all_readers) < self._read_pool_size:
+                if not os.path.exists(self.db):
+                    # la conexion de solo lectura no puede crear el archivo
+                    with self._write_lock:
+                        self._writer_connection()
+                uri = pathlib.Path(self.db).absolute().as_uri() + "?mode=ro"
+                conn = sqlite3.connect(uri, uri=True, check_same_thread=False, timeout=5)
+                for pragma in READER_PRAGMAS:
+                    conn.execute(pragma)
+                self._all_readers.append(conn)
+                return conn
+
+        return self._readers.get()
+
+    @contextmanager
+    def _write(self):
+        '''
+        entrega la conexion de escritura con el lock tomado, hace commit al
+        salir o rollback si hubo un error
+        '''
+        with self._write_lock:
+            conn = self._writer_connection()
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    @contextmanager
+    def _read(self):
+        '''
+        toma prestada una conexion del pool de lectura y la devuelve al salir
+        '''
+        if self.db == ":memory:":
+            # una base en memoria solo existe para la conexion que la creo
+            with self._write_lock:
+                yield self._writer_connection()
+            return
+
+        conn = self._reader_connection()
+        try:
+            yield conn
+        finally:
+            if conn in self._all_readers:
+                self._readers.put(conn)
+
+    def _start_flusher(self) -> None:
+        with self._flusher_lock:
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._flush_loop, name="db_flusher", daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        '''
+        junta filas de la cola hasta tener flush_rows o hasta que pasen
+        flush_interval segundos desde la primera, y las guarda juntas
+        '''
+        running = True
+        while running:
+            batch = [self._pending.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.flush_rows and batch[-1] is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            if batch[-1] is None:
+                # None es la señal de cierre que encola close
+                running = False
+
+            rows = [row for row in batch if row is not None]
+            try:
+                self._write_rows(rows)
+            except Exception:
+                # una fila mala deshace todo el lote, se reintentan una por una
+                # para no perder las demas; cada una lleva su resumen, asi una
+                # fila rechazada tampoco cuenta en rollups
+                for row in rows:
+                    try:
+                        self._write_rows([row])
+                    except Exception as e:
+                        print(f'No se pudo guardar una fila: {e}')
+                        self.write_errors += 1
+                        self._write_error = e
+            finally:
+                for _ in batch:
+                    self._pending.task_done()
+
+    def _raise_write_error(self) -> None:
+        '''
+        vuelve a lanzar el ultimo error del hilo de escritura, una sola vez
+        '''
+        error, self._write_error = self._write_error, None
+        if error is not None:
+            raise error
+
+    def _write_rows(self, rows:list[tuple]) -> None:
+        '''
+        guarda las filas encoladas en una sola transaccion con un executemany
+        por sentencia; cada una es ([(sql, [parametros, ...]), ...], resumen)
+        con las sentencias de una muestra y su entrada para los resumenes
+        (uid, canales, sample, tiempo, valores), o None si no lleva
+        '''
+        if not rows:
+            return
+
+        grouped = {}
+        to_rollup = {}
+        for statements, rollup in rows:
+            for sql, params in statements:
+                grouped.setdefault(sql, []).extend(params)
+            if rollup is not None:
+                uid, channels, sample, timestamp, values = rollup
+                to_rollup.setdefault((uid, channels), []).append((sample, timestamp, values))
+
+        with self._write() as conn, closing(conn.cursor()) as cur:
+            for sql, params in grouped.items():
+                cur.executemany(sql, params)
+            for (uid, channels), entries in to_rollup.items():
+                samples, times, values = zip(*entries)
+                cur.executemany(UPSERT_ROLLUP, aggregate(uid, channels, samples, times, values))
+
+    def flush(self) -> None:
+        '''
+        espera a que todas las filas encoladas con record_data esten guardadas
+        '''
+        if self._flusher is not None and self._flusher.is_alive():
+            self._pending.join()
+        self._raise_write_error()
+
+    def close(self) -> None:
+        '''
+        guarda las filas pendientes y cierra todas las conexiones abiertas, el
+        objeto se puede seguir usando y vuelve a abrirlas si hace falta
+        '''
+        with self._flusher_lock:
+            if self._flusher is not None and self._flusher.is_alive():
+                self._pending.put(None)
+                self._flusher.join()
+            self._flusher = None
+
+        with self._pool_lock:
+            for conn in self._all_readers:
+                conn.close()
+            self._all_readers = []
+            self._readers = queue.LifoQueue()
+
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
 
     def get_params_header(sensors:tuple, params:tuple) -> list[str]:
         '''
@@ -34,8 +299,7 @@ class Database:
         '''
         crea una tabla en la base de datos
         '''
-        conn = sqlite3.connect(self.db)
-        with closing(conn.cursor()) as cur:
+        with self._write() as conn, closing(conn.cursor()) as cur:
             cur.execute(
                 '''
                 CREATE TABLE "session" (
@@ -46,21 +310,18 @@ class Database:
                 )
                 '''
             )
-        conn.close()
 
     def session_table_exists(self)-> bool:
         '''
         revisa que la tabla de sesiones exista
         '''
-        conn = sqlite3.connect(self.db)
-        with closing(conn.cursor()) as cur:
+        with self._read() as conn, closing(conn.cursor()) as cur:
             tmplist = cur.execute(
                 '''
                 SELECT name FROM sqlite_master 
                 WHERE type='table' AND name='session';
                 '''
             ).fetchall()
-        conn.close()
 
         if tmplist == []:
              return 0
@@ -72,15 +333,13 @@ class Database:
         '''
         revisa que la información de la sesión ya exista en la tabla session
         '''
-        conn = sqlite3.connect(self.db)
-        with closing(conn.cursor()) as cur:
+        with self._read() as conn, closing(conn.cursor()) as cur:
             tmplist = cur.execute(
                 '''
                 SELECT id FROM session WHERE id = ?
                 ''',
                 (uid,)
             ).fetchall()
-        conn.close()
 
         if tmplist == []:
              return False
@@ -91,8 +350,7 @@ class Database:
         '''
         registra los datos de los campos que se pueden llenar en la tabla de las sesiones
         '''
-        conn = sqlite3.connect(self.db)
-        with closing(conn.cursor()) as cur:
+        with self._write() as conn, closing(conn.cursor()) as cur:
             try:
                 cur.execute(
                     '''
@@ -101,15 +359,12 @@ class Database:
                     ''',
                     (uid, len(sensors), notes)
                 )
-                conn.commit()
             except sqlite3.IntegrityError:
                 # La sesión ya existe, no hacer nada
                 pass
-        conn.close()
 
     def update_notes(self, uid:int, notes:str) -> None:
-        conn = sqlite3.connect(self.db)
-        with closing(conn.cursor()) as cur:
+        with self._write() as conn, closing(conn.cursor()) as cur:
                 cur.execute(
                     f'''
                     UPDATE session
@@ -119,86 +374,203 @@ class Database:
                     ''',
                     (notes,uid)
                 )
-                conn.commit()
-        conn.close()
 
     def create_session(self, uid:int, header:str) -> None:
         '''
         crea una tabla para una sesion tomando en cuenta el header que corresponda a la sesion 
         y el uid que se usa para registrar la sesion, se espera que sea el mismo
-        '''
-        conn = sqlite3.connect(self.db)
-        with closing(conn.cursor()) as cur:
-            cur.execute(f'CREATE TABLE session_{uid}({header[0]})')
-        conn.close()
 
-    def session_exists(self, uid:int)-> bool:
-        '''
-        revisa que la tabla de sesiones exista
+        cada fila lleva un indice de muestra (que es el rowid de la tabla) y la
+        hora de la muestra en segundos desde epoch, con su propio indice
+
+        en la forma LONG no se crea ninguna tabla, solo se registran los
+        nombres de las columnas del header en long_channels
         '''
-        conn = sqlite3.connect(self.db)
-        with closing(conn.cursor()) as cur:
-            tmplist = cur.execute(
+        if self.layout == LONG:
+            self._create_long_session(uid, header)
+            return
+
+        with self._write() as conn, closing(conn.cursor()) as cur:
+            for statement in ROLLUP_SCHEMA:
+                cur.execute(statement)
+            cur.execute(
                 f'''
-                SELECT name FROM sqlite_master 
-                WHERE type='table' AND name='session_{uid}';
+                CREATE TABLE session_{uid}(
+                    "sample" INTEGER PRIMARY KEY,
+                    "time" REAL NOT NULL,
+                    {header[0]}
+                )
                 '''
-            ).fetchall()
-        conn.close()
+            )
+            cur.execute(f'CREATE INDEX session_{uid}_time ON session_{uid}("time")')
 
-        if tmplist == []:
-             return 0
-        else:
-             return 1
+    def _create_long_session(self, uid:int, header:list[str]) -> None:
+        names = re.findall(r'"([^"]+)"', header[0])
+        params = list(dict.fromkeys(re.sub(r'\d+$', '', name) for name in names))
 
-    def record_data(self, uid:int, header:list[str], data:list[np.ndarray]) -> None:
+        with self._write() as conn, closing(conn.cursor()) as cur:
+            for statement in LONG_SCHEMA + ROLLUP_SCHEMA:
+                cur.execute(statement)
+            cur.executemany(
+                '''
+                INSERT INTO "long_channels" ("session","sensor","param","name")
+                VALUES (?, ?, ?, ?)
+                ''',
+                [(uid, i // len(params), i % len(params), name) for i, name in enumerate(names)]
+            )
+        self._session_layouts[uid] = LONG
+
+    def session_layout(self, uid:int) -> str:
+        '''
+        devuelve WIDE, LONG o LEGACY segun como se grabo la sesion, o None si
+        la sesion no existe
+        '''
+        if uid not in self._session_layouts:
+            if self.session_columns(uid):
+                layout = LEGACY if "time" not in self.session_columns(uid) else WIDE
+            elif self.long_channels(uid):
+                layout = LONG
+            else:
+                return None
+            self._session_layouts[uid] = layout
+        return self._session_layouts[uid]
+
+    def long_channels(self, uid:int) -> list[tuple]:
+        '''
+        devuelve [(sensor, param, nombre), ...] de una sesion LONG en el orden
+        del header con el que se creo
+        '''
+        if uid not in self._long_channels:
+            with self._read() as conn, closing(conn.cursor()) as cur:
+                exists = cur.execute(
+                    "SELECT name FROM sqlite_master WHERE type='table' AND name='long_channels'"
+                ).fetchall()
+                if not exists:
+                    return []
+                channels = cur.execute(
+                    '''
+                    SELECT "sensor", "param", "name" FROM "long_channels"
+                    WHERE "session" = ? ORDER BY "sensor", "param"
+                    ''',
+                    (uid,)
+                ).fetchall()
+            if not channels:
+                return []
+            self._long_channels[uid] = channels
+        return self._long_channels[uid]
+
+    def session_columns(self, uid:int) -> list[str]:
+        '''
+        devuelve las columnas de la tabla de la sesion
+        '''
+        if uid not in self._session_columns:
+            with self._read() as conn, closing(conn.cursor()) as cur:
+                columns = [row[1] for row in cur.execute(f'PRAGMA table_info(session_{uid})')]
+            if not columns:
+                return []
+            self._session_columns[uid] = columns
+        return self._session_columns[uid]
+
+    def is_legacy_session(self, uid:int) -> bool:
+        '''
+        las sesiones grabadas antes de agregar las columnas sample y time solo
+        se pueden leer por posicion
+        '''
+        return self.session_layout(uid) == LEGACY
+
+    def session_exists(self, uid:int)-> bool:
+        '''
+        revisa que la sesion exista, en cualquiera de las formas en que se
+        pudo grabar (no solo en la configurada en layout)
+        '''
+        return int(self.session_layout(uid) is not None)
+
+    def record_data(self, uid:int, header:list[str], data:list[np.ndarray],
+                    sample:int = None, timestamp:float = None) -> None:
         '''
         espera una lista de los arreglos que contienen los datos de los sensores,
         en el mismo orden en el que estan declarados los sensores en el header
 
         Igualmente se espera que ya se haya creado una sesion con create_session,
         y pone los datos de los sensores en donde corresponden en la tabla
+
+        sample es el indice de la muestra (si es None sqlite asigna el siguiente)
+        y timestamp la hora de la lectura, por defecto la hora actual
+
+        La fila se guarda de forma diferida (ver flush), si la cola esta llena
+        espera a que el hilo de escritura libere espacio; en el mismo lote se
+        actualizan los resumenes de la sesion (solo si se da sample)
+
+        si el hilo de escritura no pudo guardar filas anteriores, lanza ese
+        error antes de encolar esta (write_errors cuenta las filas perdidas)
         '''
-        to_rec = []
-        for array in data:
-             for i in array:
-                  to_rec.append(i)
+        self._raise_write_error()
+        if timestamp is None:
+            timestamp = time.time()
+        values = np.concatenate([np.ravel(array) for array in data]).tolist()
 
-        conn = sqlite3.connect(self.db)
-        with closing(conn.cursor()) as cur:
-                cur.execute(
-                    f'''
-                    INSERT INTO "session_{uid}" ({header[0]})
-                    VALUES ({header[1]})
+        if self.layout == LONG:
+            self._record_long(uid, values, sample, timestamp)
+            return
+
+        to_rec = [sample, timestamp] + values
+
+        sql = f'''
+            INSERT INTO "session_{uid}" ("sample","time",{header[0]})
+            VALUES (?,?,{header[1]})
+            '''
+        rollup = None
+        if sample is not None:
+            rollup = (uid, tuple(re.findall(r'"([^"]+)"', header[0])), sample, timestamp, values)
+        self._start_flusher()
+        self._pending.put(([(sql, [to_rec])], rollup))
+
+    def _record_long(self, uid:int, values:list, sample:int, timestamp:float) -> None:
+        if sample is None:
+            sample = self._next_sample.get(uid, 0)
+        self._next_sample[uid] = sample + 1
+
+        channels = self.long_channels(uid)
+        self._start_flusher()
+        self._pending.put((
+            [
+                (
+                    '''
+                    INSERT INTO "sample_times" ("session","sample","time")
+                    VALUES (?, ?, ?)
                     ''',
-                    to_rec
-                )
-                conn.commit()
-        conn.close()
+                    [(uid, sample, timestamp)]
+                ),
+                (
+                    '''
+                    INSERT INTO "samples" ("session","sensor","param","sample","value")
+                    VALUES (?, ?, ?, ?, ?)
+                    ''',
+                    [(uid, sensor, param, sample, value) for (sensor, param, _), value in zip(channels, values)]
+                ),
+            ],
+            (uid, tuple(name for _, _, name in channels), sample, timestamp, values)
+        ))
                
     def create_events(self, uid:int) -> None:
         '''
         crea una tabla para una sesion tomando en cuenta el header que corresponda a la sesion 
         y el uid que se usa para registrar la sesion, se espera que sea el mismo
         '''
-        conn = sqlite3.connect(self.db)
-        with closing(conn.cursor()) as cur:
+        with self._write() as conn, closing(conn.cursor()) as cur:
             cur.execute(f'CREATE TABLE events_{uid}("time", "event")')
-        conn.close()
 
     def events_exists(self, uid:int)-> bool:
         '''
         revisa que la tabla de sesiones exista
         '''
-        conn = sqlite3.connect(self.db)
-        with closing(conn.cursor()) as cur:
+        with self._read() as conn, closing(conn.cursor()) as cur:
             tmplist = cur.execute(
                 f'''
                 SELECT name FROM sqlite_master 
                 WHERE type='table' AND name='events_{uid}';
                 '''
             ).fetchall()
-        conn.close()
 
         if tmplist == []:
              return 0
@@ -209,8 +581,7 @@ class Database:
         '''
         registra los datos de los campos que se pueden llenar en la tabla de las sesiones
         '''
-        conn = sqlite3.connect(self.db)
-        with closing(conn.cursor()) as cur:
+        with self._write() as conn, closing(conn.cursor()) as cur:
                 cur.execute(
                     f'''
                     INSERT INTO "events_{uid}" ("time","event")
@@ -218,30 +589,313 @@ class Database:
                     ''',
                     (time, event)
                 )
-                conn.commit()
-        conn.close()
 
-    def get_session(self, uid:int, start:int, stop:int, offset:int = 2):
-        with closing(sqlite3.connect(self.db)) as conn:
+    def get_session(self, uid:int, start:int, stop:int, offset:int = LEGACY_OFFSET):
+        '''
+        devuelve las muestras con indice en [start, stop) indexadas por sample,
+        la busqueda usa la llave primaria asi que no depende de la posicion
+
+        las sesiones antiguas no tienen indice de muestra y se leen por
+        posicion, desplazando el indice por offset como antes
+        '''
+        if self.is_legacy_session(uid):
+            with self._read() as conn:
+                return pd.read_sql(
+                    f"SELECT * FROM session_{uid} LIMIT {stop-start} OFFSET {start}", conn
+                ).set_index(np.arange(start-offset, stop-offset))
+
+        if self.session_layout(uid) == LONG:
+            return self._get_long_session(uid, start, stop)
+
+        with self._read() as conn:
             return pd.read_sql(
-                f"SELECT * FROM session_{uid} LIMIT {stop-start} OFFSET {start}", conn
-            ).set_index(np.arange(start-offset, stop-offset))
+                f'SELECT * FROM session_{uid} WHERE "sample" >= ? AND "sample" < ?',
+                conn,
+                params=(int(start), int(stop)),
+                index_col="sample"
+            )
+
+    def get_session_range(self, uid:int, t0:float, t1:float):
+        '''
+        devuelve las muestras tomadas entre t0 y t1 (segundos desde epoch,
+        t1 excluido) indexadas por sample, usando el indice de la columna time
+        '''
+        if self.is_legacy_session(uid):
+            raise ValueError(f"session_{uid} no tiene columna de tiempo")
+
+        if self.session_layout(uid) == LONG:
+            with self._read() as conn, closing(conn.cursor()) as cur:
+                first, last = cur.execute(
+                    '''
+                    SELECT MIN("sample"), MAX("sample") FROM "sample_times"
+                    WHERE "session" = ? AND "time" >= ? AND "time" < ?
+                    ''',
+                    (uid, float(t0), float(t1))
+                ).fetchone()
+            if first is None:
+                return self._get_long_session(uid, 0, 0)
+            return self._get_long_session(uid, first, last + 1)
+
+        with self._read() as conn:
+            return pd.read_sql(
+                f'SELECT * FROM session_{uid} WHERE "time" >= ? AND "time" < ? ORDER BY "time"',
+                conn,
+                params=(float(t0), float(t1)),
+                index_col="sample"
+            )
         
+    def _get_long_session(self, uid:int, start:int, stop:int, channels:list[tuple] = None):
+        '''
+        lee las muestras [start, stop) de una sesion LONG y las devuelve con la
+        misma forma que una tabla WIDE: indice sample, columna time y una
+        columna por canal
+        '''
+        channels = channels if channels is not None else self.long_channels(uid)
+        sensors = sorted({sensor for sensor, _, _ in channels})
+        params = sorted({param for _, param, _ in channels})
+
+        # los IN sobre las primeras columnas de la llave primaria permiten
+        # saltar directamente al rango de cada (sensor, param)
+        with self._read() as conn:
+            times = pd.read_sql(
+                '''
+                SELECT "sample", "time" FROM "sample_times"
+                WHERE "session" = ? AND "sample" >= ? AND "sample" < ?
+                ''',
+                conn,
+                params=(uid, int(start), int(stop)),
+                index_col="sample"
+            )
+            values = pd.read_sql(
+                f'''
+                SELECT "sensor", "param", "sample", "value" FROM "samples"
+                WHERE "session" = ?
+                    AND "sensor" IN ({",".join("?" * len(sensors))})
+                    AND "param" IN ({",".join("?" * len(params))})
+                    AND "sample" >= ? AND "sample" < ?
+                ''',
+                conn,
+                params=(uid, *sensors, *params, int(start), int(stop))
+            )
+
+        names = {(sensor, param): name for sensor, param, name in channels}
+        values["name"] = [names.get(key) for key in zip(values["sensor"], values["param"])]
+        wide = values.dropna(subset=["name"]).pivot(index="sample", columns="name", values="value")
+        wide = wide.reindex(index=times.index, columns=[name for _, _, name in channels])
+        wide.columns.name = None
+        wide.insert(0, "time", times["time"])
+        return wide
+
+    def get_channel(self, uid:int, sensor:int, param:str, start:int = None, stop:int = None,
+                    offset:int = LEGACY_OFFSET):
+        '''
+        devuelve la serie de un solo parametro de un sensor (p.ej. sensor 2,
+        "attention") indexada por sample, opcionalmente en [start, stop)
+
+        en la forma LONG solo se leen las filas de ese canal; las sesiones
+        antiguas se leen por posicion con el indice desplazado por offset,
+        igual que get_session. Si el canal no existe devuelve una serie vacia
+        '''
+        start = 0 if start is None else start
+        stop = np.iinfo(np.int64).max if stop is None else stop
+        name = f"{param}{sensor}"
+
+        if self.session_layout(uid) == LONG:
+            channels = [channel for channel in self.long_channels(uid) if channel[2] == name]
+            if not channels:
+                return pd.Series(dtype=np.float64, name=name, index=pd.Index([], name="sample"))
+            return self._get_long_session(uid, start, stop, channels)[name]
+
+        if name not in self.session_columns(uid):
+            return pd.Series(dtype=np.float64, name=name, index=pd.Index([], name="sample"))
+
+        if self.is_legacy_session(uid):
+            # mismas filas e indice que get_session: posiciones [start, stop) con indice - offset
+            with self._read() as conn:
+                series = pd.read_sql(
+                    f'SELECT "{name}" FROM session_{uid} LIMIT ? OFFSET ?',
+                    conn,
+                    params=(int(stop) - int(start), int(start))
+                )[name]
+            series.index = pd.RangeIndex(start - offset, start - offset + len(series), name="sample")
+            return series
+
+        with self._read() as conn:
+            return pd.read_sql(
+                f'SELECT "sample", "{name}" FROM session_{uid} WHERE "sample" >= ? AND "sample" < ?',
+                conn,
+                params=(int(start), int(stop)),
+                index_col="sample"
+            )[name]
+
+    def sample_bounds(self, uid:int) -> tuple[int, int]:
+        '''
+        devuelve (primer sample, ultimo sample + 1) de la sesion, para las
+        sesiones antiguas es (0, numero de filas)
+        '''
+        layout = self.session_layout(uid)
+        if layout == LONG:
+            sql, params = 'SELECT MIN("sample"), MAX("sample") + 1 FROM "sample_times" WHERE "session" = ?', (uid,)
+        elif layout == WIDE:
+            sql, params = f'SELECT MIN("sample"), MAX("sample") + 1 FROM session_{uid}', ()
+        else:
+            sql, params = f'SELECT 0, COUNT(*) FROM session_{uid}', ()
+
+        with self._read() as conn, closing(conn.cursor()) as cur:
+            first, stop = cur.execute(sql, params).fetchone()
+        if first is None:
+            return 0, 0
+        return first, stop
+
+    def session_version(self, uid:int) -> tuple:
+        '''
+        devuelve (primer sample, ultimo sample + 1, eventos, ultimo evento,
+        notas) de la sesion; cambia cada vez que se graba una muestra, un
+        evento o se editan las notas, y sirve para invalidar caches
+        '''
+        first, stop = self.sample_bounds(uid)
+        has_events = self.events_exists(uid)
+        with self._read() as conn, closing(conn.cursor()) as cur:
+            events = (0, None)
+            if has_events:
+                events = cur.execute(f'SELECT COUNT(*), MAX(rowid) FROM events_{uid}').fetchone()
+            notes = cur.execute('SELECT notes FROM session WHERE id = ?', (uid,)).fetchone()
+        return (first, stop, *events, notes[0] if notes else None)
+
+    def sample_times(self, uid:int, after:int = -1) -> tuple[np.ndarray, np.ndarray]:
+        '''
+        devuelve (samples, tiempos) de las muestras con indice mayor a after,
+        ordenadas por sample; se lee por la llave primaria, asi que pedir solo
+        las muestras nuevas de una sesion en curso es barato
+        '''
+        if self.is_legacy_session(uid):
+            raise ValueError(f"session_{uid} no tiene columna de tiempo")
+
+        if self.session_layout(uid) == LONG:
+            sql, params = (
+                'SELECT "sample", "time" FROM "sample_times" WHERE "session" = ? AND "sample" > ? ORDER BY "sample"',
+                (uid, int(after))
+            )
+        else:
+            sql, params = f'SELECT "sample", "time" FROM session_{uid} WHERE "sample" > ? ORDER BY "sample"', (int(after),)
+
+        with self._read() as conn, closing(conn.cursor()) as cur:
+            rows = cur.execute(sql, params).fetchall()
+        if not rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+        samples, times = zip(*rows)
+        return np.asarray(samples, dtype=np.int64), np.asarray(times, dtype=np.float64)
+
+    def has_rollups(self, uid:int) -> bool:
+        '''
+        revisa que la sesion tenga resumenes en la tabla rollups
+        '''
+        with self._read() as conn, closing(conn.cursor()) as cur:
+            exists = cur.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name='rollups'"
+            ).fetchall()
+            if not exists:
+                return False
+            return cur.execute(
+                'SELECT 1 FROM "rollups" WHERE "session" = ? LIMIT 1', (uid,)
+            ).fetchone() is not None
+
+    def backfill_rollups(self, uid:int, chunk:int = 20000) -> None:
+        '''
+        recalcula los resumenes de una sesion completa leyendolo por bloques,
+        sirve para sesiones grabadas antes de que existieran
+
+        las sesiones antiguas no tienen hora, se toma el indice de cada fila
+        como segundos (se grababan a 1 Hz); sus cubetas se guardan por posicion,
+        la misma numeracion que sample_bounds y los start/stop de get_session
+        '''
+        first, stop = self.sample_bounds(uid)
+        legacy = self.is_legacy_session(uid)
+
+        with self._write() as conn, closing(conn.cursor()) as cur:
+            for statement in ROLLUP_SCHEMA:
+                cur.execute(statement)
+            cur.execute('DELETE FROM "rollups" WHERE "session" = ?', (uid,))
+
+        for start in range(first, stop, chunk):
+            frame = self.get_session(uid, start, min(start + chunk, stop))
+            samples = frame.index.to_numpy() + LEGACY_OFFSET if legacy else frame.index.to_numpy()
+            times = samples if legacy else frame.pop("time").to_numpy()
+            rows = aggregate(uid, list(frame.columns), samples, times, frame.to_numpy())
+            with self._write() as conn, closing(conn.cursor()) as cur:
+                cur.executemany(UPSERT_ROLLUP, rows)
+
+    def rollup_bucket_count(self, uid:int, width:int, start:int, stop:int) -> int:
+        '''
+        cuenta cuantas cubetas de un ancho tocan [start, stop); se cuentan las
+        de todos los canales porque un canal sin datos en una cubeta (un
+        sensor perdido) no la guarda
+        '''
+        with self._read() as conn, closing(conn.cursor()) as cur:
+            exists = cur.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name='rollups'"
+            ).fetchall()
+            if not exists:
+                return 0
+            return cur.execute(
+                '''
+                SELECT COUNT(DISTINCT "bucket") FROM "rollups"
+                WHERE "session" = ? AND "width" = ?
+                    AND "last_sample" >= ? AND "first_sample" < ?
+                ''',
+                (uid, width, int(start), int(stop))
+            ).fetchone()[0]
+
+    def get_rollup(self, uid:int, width:int, start:int, stop:int, channels:list[str] = None):
+        '''
+        devuelve los resumenes de un ancho cuyas cubetas tocan [start, stop)
+        (incluida la que empieza antes de start), indexados por el primer
+        sample de cada cubeta y con columnas (estadistica, canal), estadistica
+        es "mean", "min" o "max"
+
+        en las sesiones antiguas start y stop son posiciones, como en
+        get_session, y el indice se desplaza igual que sus filas
+        '''
+        sql = '''
+            SELECT "channel", "bucket", "first_sample", "total" / "n" AS "mean", "vmin" AS "min", "vmax" AS "max"
+            FROM "rollups"
+            WHERE "session" = ? AND "width" = ? AND "last_sample" >= ? AND "first_sample" < ?
+            '''
+        params = [uid, width, int(start), int(stop)]
+        if channels is not None:
+            sql += f' AND "channel" IN ({",".join("?" * len(channels))})'
+            params += list(channels)
+
+        with self._read() as conn:
+            frame = pd.read_sql(sql, conn, params=params)
+
+        # un canal que empezo a tener datos a mitad de la cubeta tiene otro
+        # first_sample, se agrupa por cubeta y se indexa con el primero de todos
+        rollup = frame.pivot(index="bucket", columns="channel", values=["mean", "min", "max"])
+        rollup.index = frame.groupby("bucket")["first_sample"].min().reindex(rollup.index).to_numpy()
+        rollup.index.name = "first_sample"
+        if channels is not None:
+            rollup = rollup.reindex(columns=pd.MultiIndex.from_product([["mean", "min", "max"], channels]))
+        if self.is_legacy_session(uid):
+            # se buscan por posicion pero se indexan como las filas de get_session
+            rollup.index = rollup.index - LEGACY_OFFSET
+        return rollup
+
     def get_events(self, uid:int):
-        with closing(sqlite3.connect(self.db)) as conn:
+        with self._read() as conn:
             return pd.read_sql(
                 f"SELECT * FROM events_{uid}", conn
             )
         
     def list_sessions(self):
-        with closing(sqlite3.connect(self.db)) as conn:
+        with self._read() as conn:
             sessions = pd.read_sql("SELECT id, notes FROM session", conn)
             sessions["date"] = sessions["id"].apply(get_date)
 
             return sessions
         
     def get_notes(self, uid:int):
-        with closing(sqlite3.connect(self.db)) as conn:
+        with self._read() as conn:
             return pd.read_sql(
                 f"SELECT notes FROM session WHERE id={uid}", conn
             )
\ No newline at end of file
@@ -0,0 +1,88 @@
+"""
+Resumenes (min, max, promedio) de las sesiones en cubetas de tiempo fijas.
+
+Permiten graficar sesiones largas con unos miles de puntos en lugar de leer
+todas las muestras.
+"""
+
+import numpy as np
+
+# Anchos de cubeta en segundos
+ROLLUP_WIDTHS = (10, 60, 600)
+
+ROLLUP_SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS "rollups" (
+        "session"	INTEGER NOT NULL,
+        "width"	INTEGER NOT NULL,
+        "channel"	TEXT NOT NULL,
+        "bucket"	INTEGER NOT NULL,
+        "first_sample"	INTEGER NOT NULL,
+        "last_sample"	INTEGER NOT NULL,
+        "n"	INTEGER NOT NULL,
+        "total"	REAL,
+        "vmin"	REAL,
+        "vmax"	REAL,
+        PRIMARY KEY("session","width","channel","bucket")
+    ) WITHOUT ROWID
+    ''',
+)
+
+# Una cubeta puede recibir muestras en varios lotes, se combinan al insertar
+UPSERT_ROLLUP = '''
+    INSERT INTO "rollups"
+        ("session","width","channel","bucket","first_sample","last_sample","n","total","vmin","vmax")
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT("session","width","channel","bucket") DO UPDATE SET
+        "first_sample" = min("first_sample", excluded."first_sample"),
+        "last_sample" = max("last_sample", excluded."last_sample"),
+        "n" = "n" + excluded."n",
+        "total" = "total" + excluded."total",
+        "vmin" = min("vmin", excluded."vmin"),
+        "vmax" = max("vmax", excluded."vmax")
+'''
+
+
+def aggregate(uid:int, channels:list[str], samples:np.ndarray, times:np.ndarray,
+              values:np.ndarray, widths:tuple = ROLLUP_WIDTHS) -> list[tuple]:
+    '''
+    agrupa un bloque de muestras en cubetas de cada ancho y devuelve las filas
+    para UPSERT_ROLLUP
+
+    samples y times tienen una entrada por muestra, ordenadas por tiempo, y
+    values tiene forma (muestras, canales) en el orden de channels; los NaN
+    no cuentan para la suma ni para min/max
+    '''
+    samples = np.asarray(samples, dtype=np.int64)
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64).reshape(len(samples), len(channels))
+    if len(samples) == 0:
+        return []
+
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    low = np.where(valid, values, np.inf)
+    high = np.where(valid, values, -np.inf)
+
+    rows = []
+    for width in widths:
+        buckets = np.floor(times / width).astype(np.int64)
+        # times esta ordenado, cada cubeta es un tramo contiguo
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        ends = np.r_[starts[1:], len(buckets)] - 1
+
+        n = np.add.reduceat(valid, starts, axis=0)
+        total = np.add.reduceat(filled, starts, axis=0)
+        vmin = np.minimum.reduceat(low, starts, axis=0)
+        vmax = np.maximum.reduceat(high, starts, axis=0)
+
+        for b, (start, end) in enumerate(zip(starts, ends)):
+            for c, channel in enumerate(channels):
+                if n[b, c] == 0:
+                    continue
+                rows.append((
+                    uid, width, channel, int(buckets[start]),
+                    int(samples[start]), int(samples[end]), int(n[b, c]),
+                    float(total[b, c]), float(vmin[b, c]), float(vmax[b, c])
+                ))
+    return rows
@@ -0,0 +1,169 @@
+"""
+Busqueda de muestras por tiempo sobre la base de datos, para recorrer una
+sesion completa desde el timeline del cerebro.
+
+La tabla tiempo -> sample de cada sesion se lee una vez (y despues solo las
+muestras nuevas) y se busca con bisect; las filas se leen en ventanas de
+muestras contiguas que se guardan en un cache LRU, y al abrir una ventana se
+precargan sus vecinas en segundo plano para que avanzar o retroceder sea
+inmediato.
+"""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from src.py.utils.utils import Utils
+
+# Muestras por ventana (5 min a 1 muestra por segundo)
+WINDOW_SAMPLES = 300
+
+# Ventanas que se conservan en memoria
+MAX_WINDOWS = 16
+
+
+def row_to_memory(uid:int, row) -> dict:
+    '''
+    convierte una fila de la sesion (columnas "{parametro}{sensor}") al
+    formato de la store "memory": {"uid":..., sensor:{parametro:valor}}
+    '''
+    memory = {"uid": uid}
+    for sensor, index in Utils.SENSORS_MAP.items():
+        values = {}
+        for param in Utils.SENSOR_PARAMS:
+            value = row.get(f"{param}{index}")
+            if value is not None and not np.isnan(value):
+                values[param] = float(value)
+        memory[sensor] = values
+    return memory
+
+
+class SessionScrubber:
+    """
+    Lee muestras de cualquier momento de una sesion con cache de ventanas.
+    """
+
+    def __init__(self, db, window:int = WINDOW_SAMPLES, max_windows:int = MAX_WINDOWS) -> None:
+        self.db = db
+        self.window = window
+        self.max_windows = max_windows
+        self._times = {}
+        self._windows = OrderedDict()
+        self._pending = set()
+        self._lock = threading.Lock()
+        # una sola lectura incremental de tiempos a la vez por scrubber
+        self._refresh_lock = threading.Lock()
+        self._prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scrubber")
+
+    def _timeline(self, uid:int) -> tuple[np.ndarray, np.ndarray]:
+        '''
+        samples y tiempos (s desde la primera muestra) de la sesion, leyendo de
+        la base solo lo que se grabo despues de la ultima consulta
+        '''
+        with self._refresh_lock:
+            samples, times, start = self._times.get(uid, (np.zeros(0, dtype=np.int64), np.zeros(0), None))
+            after = int(samples[-1]) if len(samples) else -1
+
+            new_samples, new_times = self.db.sample_times(uid, after)
+            if len(new_samples):
+                start = new_times[0] if start is None else start
+                samples = np.concatenate([samples, new_samples])
+                times = np.concatenate([times, new_times - start])
+                self._times[uid] = (samples, times, start)
+            return samples, times
+
+    def duration(self, uid:int) -> float:
+        '''
+        segundos entre la primera y la ultima muestra guardada
+        '''
+        _, times = self._timeline(uid)
+        return float(times[-1]) if len(times) else 0.0
+
+    def nearest_sample(self, uid:int, seconds:float) -> int:
+        '''
+        sample mas cercano a seconds (desde la primera muestra), None si la
+        sesion no tiene muestras
+        '''
+        samples, times = self._timeline(uid)
+        if len(samples) == 0:
+            return None
+        position = int(np.searchsorted(times, seconds))
+        if position == len(times) or (position > 0 and seconds - times[position - 1] <= times[position] - seconds):
+            position -= 1
+        return int(samples[position])
+
+    def _window_rows(self, uid:int, index:int) -> int:
+        '''
+        cuantas muestras de la ventana index hay en la base segun la ultima
+        lectura de tiempos, sin volver a consultarla
+        '''
+        if uid not in self._times:
+            self._timeline(uid)
+        samples = self._times.get(uid, (np.zeros(0, dtype=np.int64),))[0]
+        first, last = np.searchsorted(samples, [index * self.window, (index + 1) * self.window])
+        return int(last - first)
+
+    def _load_window(self, uid:int, index:int):
+        key = (uid, index)
+        rows = self._window_rows(uid, index)
+        with self._lock:
+            # la ultima ventana de una sesion en curso se guarda con las filas
+            # que tenia, si la sesion crecio desde entonces se vuelve a leer
+            if key in self._windows and len(self._windows[key]) == rows:
+                self._windows.move_to_end(key)
+                return self._windows[key]
+
+        frame = self.db.get_session(uid, index * self.window, (index + 1) * self.window)
+
+        with self._lock:
+            self._windows[key] = frame
+            self._windows.move_to_end(key)
+            while len(self._windows) > self.max_windows:
+                self._windows.popitem(last=False)
+        return frame
+
+    def _prefetch(self, uid:int, index:int) -> None:
+        for neighbour in (index + 1, index - 1):
+            key = (uid, neighbour)
+            # no se precargan ventanas vacias despues de la ultima muestra
+            if neighbour < 0 or self._window_rows(uid, neighbour) == 0:
+                continue
+            with self._lock:
+                if key in self._windows or key in self._pending:
+                    continue
+                self._pending.add(key)
+            self._prefetcher.submit(self._prefetch_window, uid, neighbour)
+
+    def _prefetch_window(self, uid:int, index:int) -> None:
+        try:
+            self._load_window(uid, index)
+        except Exception as e:
+            print(f'No se pudo precargar la ventana {index} de session_{uid}: {e}')
+        finally:
+            with self._lock:
+                self._pending.discard((uid, index))
+
+    def memory_at(self, uid:int, sample:int) -> dict:
+        '''
+        muestra sample en formato memory, None si no esta en la base
+        '''
+        index = sample // self.window
+        frame = self._load_window(uid, index)
+        self._prefetch(uid, index)
+        if sample not in frame.index:
+            return None
+        return row_to_memory(uid, frame.loc[sample])
+
+    def sample_at(self, uid:int, seconds:float) -> tuple[int, dict]:
+        '''
+        devuelve (sample, muestra en formato memory) mas cercana a seconds
+        '''
+        sample = self.nearest_sample(uid, seconds)
+        if sample is None:
+            return None, None
+        return sample, self.memory_at(uid, sample)
+
+    def close(self) -> None:
+        self._prefetcher.shutdown(wait=False, cancel_futures=True)
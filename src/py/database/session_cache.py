@@ -0,0 +1,155 @@
+"""
+Cache de sesiones cargadas para el explorador (app.py).
+
+Cada sesion se lee una sola vez con todas sus columnas entre el primer y el
+ultimo evento; la grafica de lineas y el heatmap salen de esa misma lectura,
+y marcar o desmarcar parametros o sensores solo vuelve a cortar lo que ya esta
+en memoria. Las sesiones se guardan en un LRU por uid que descarta las menos
+usadas cuando el total pasa de un limite en bytes.
+"""
+
+import threading
+from collections import OrderedDict
+
+from src.py.database.database import LEGACY_OFFSET
+from src.py.utils.utils import Utils, load_plot_frame, RAW_READ_FACTOR
+
+
+def session_channels() -> list[str]:
+    '''
+    columnas "{parametro}{sensor}" de todos los sensores de la configuracion
+    '''
+    return [
+        f"{param}{index}"
+        for index in Utils.SENSORS_MAP.values()
+        for param in Utils.SENSOR_PARAMS
+    ]
+
+
+class LoadedSession:
+    """
+    Eventos y datos de una sesion ya leidos de la base.
+    """
+
+    def __init__(self, uid:int, db, version:tuple = None) -> None:
+        self.uid = uid
+        self.db = db
+        self.version = version
+        self.events = db.get_events(uid)
+        self.start, self.stop = self.events.iloc[0, 0], self.events.iloc[-1, 0]
+        self.raw = self.stop - self.start <= Utils.PLOT_MAX_POINTS * RAW_READ_FACTOR
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        '''
+        memoria que ocupan los datos cargados
+        '''
+        with self._lock:
+            frames = list(self._frames.values())
+        return int(self.events.memory_usage(deep=True).sum()) + sum(
+            int(frame.memory_usage(deep=True).sum()) for frame in frames
+        )
+
+    def _overview(self, envelope:bool):
+        # las sesiones cortas se leen crudas y sirven igual para ambas figuras
+        key = None if self.raw else envelope
+        with self._lock:
+            frame = self._frames.get(key)
+        if frame is None:
+            frame = load_plot_frame(
+                self.uid, self.db, self.start, self.stop, session_channels(), envelope=envelope
+            ) if not self.raw else self.db.get_session(self.uid, self.start, self.stop)
+            with self._lock:
+                frame = self._frames.setdefault(key, frame)
+        return frame
+
+    def load(self) -> None:
+        '''
+        lee los datos de toda la sesion que usan la grafica de lineas (envolvente
+        min/max si plot_downsample es "minmax") y el heatmap (promedio)
+        '''
+        self._overview(False)
+        self._overview(Utils.PLOT_DOWNSAMPLE == "minmax")
+
+    def frame(self, columns:list[str], start:int = None, stop:int = None, envelope:bool = False):
+        '''
+        igual que load_plot_frame para esta sesion; sin start y stop (toda la
+        sesion) o cuando la sesion se leyo cruda no se vuelve a la base
+
+        start y stop de un zoom son valores del indice (el eje x), tambien en
+        las sesiones antiguas
+        '''
+        start = self.start if start is None else start
+        stop = self.stop if stop is None else stop
+        if (start, stop) == (self.start, self.stop):
+            return self._overview(envelope).loc[:, columns]
+        if self.raw:
+            overview = self._overview(envelope)
+            return overview.loc[(overview.index >= start) & (overview.index < stop), columns]
+        # el zoom llega en valores del eje x; las sesiones antiguas se leen por
+        # posicion y su indice esta desplazado por LEGACY_OFFSET
+        if self.db.is_legacy_session(self.uid):
+            start, stop = start + LEGACY_OFFSET, stop + LEGACY_OFFSET
+        # un zoom en una sesion larga pide una resolucion distinta, no se guarda
+        return load_plot_frame(self.uid, self.db, start, stop, columns, envelope=envelope)
+
+
+class SessionCache:
+    """
+    LRU de LoadedSession por uid con limite en bytes.
+    """
+
+    def __init__(self, db, max_bytes:int = None) -> None:
+        '''
+        max_bytes es el total de memoria para todas las sesiones, por defecto
+        session_cache_mb de la configuracion
+        '''
+        self.db = db
+        self.max_bytes = Utils.SESSION_CACHE_MB * 2**20 if max_bytes is None else max_bytes
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, uid:int, version:tuple = None) -> LoadedSession:
+        '''
+        devuelve la sesion uid, leyendola si no esta en el cache o si version
+        (ver Database.session_version) no es la de la copia guardada
+        '''
+        with self._lock:
+            session = self._sessions.get(uid)
+            if session is not None and version is not None and session.version != version:
+                del self._sessions[uid]
+                session = None
+            if session is not None:
+                self._sessions.move_to_end(uid)
+        if session is None:
+            session = LoadedSession(uid, self.db, version)
+            session.load()
+            with self._lock:
+                session = self._sessions.setdefault(uid, session)
+        self._evict(keep=uid)
+        return session
+
+    def _evict(self, keep:int) -> None:
+        # la sesion que se acaba de pedir se queda aunque sola pase del limite
+        with self._lock:
+            sizes = {uid: session.nbytes for uid, session in self._sessions.items()}
+            total = sum(sizes.values())
+            for uid in list(self._sessions):
+                if total <= self.max_bytes:
+                    break
+                if uid == keep:
+                    continue
+                del self._sessions[uid]
+                total -= sizes[uid]
+
+    def invalidate(self, uid:int = None) -> None:
+        '''
+        olvida la sesion uid, o todas si uid es None
+        '''
+        with self._lock:
+            if uid is None:
+                self._sessions.clear()
+            else:
+                self._sessions.pop(uid, None)
@@ -63,7 +63,16 @@ offcanvas = dbc.Offcanvas([
                 ['signal_strength', 'attention', 'meditation'],
                 switch=True,
                 id='data_checklist'
-            )
+            ),
+    html.Hr(),
+    # "inicio" y "final" se registran con sus propios botones en la app en vivo;
+    # al elegir una sesion las opciones pasan a ser los eventos que tiene
+    dbc.Checklist(
+        ["inicio", "final", *Utils.EVENTS.keys()],
+        ["inicio", "final", *Utils.EVENTS.keys()],
+        switch=True,
+        id='event_select'
+    )
 ], id="offcanvas")
 
 spec_figure = go.Figure()
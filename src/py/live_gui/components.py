@@ -4,17 +4,54 @@ from src.py.utils.utils import heat_factory
 from src.py.utils.utils import Utils, event_factory
 from src.py.database.database import Database
 import src.py.live_gui.styles as styles
-from src.py.brain_viz.brain_components import create_brain_component
+from src.py.live_gui.stream import STREAM_URL
+from src.py.acquisition.replay import MIN_SPEED, MAX_SPEED
+from src.py.brain_viz.brain_components import BRAIN_TAB_ID, create_brain_component
 import numpy as np
 
 from dash import Dash, dcc, html, Input, Output, callback, State
 import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
 
+def replay_controls(duration:float, speed:float) -> list:
+    '''
+    velocidad y posicion de una repeticion (ver acquisition.replay), duration
+    son los segundos de la sesion repetida
+    '''
+    return [
+        html.Hr(),
+        dbc.InputGroup([
+            dbc.InputGroupText("velocidad"),
+            dbc.Input(
+                type="number",
+                min=MIN_SPEED,
+                max=MAX_SPEED,
+                step=0.5,
+                value=speed,
+                debounce=True,
+                id='replay_speed'
+            )
+        ], size="sm"),
+        dcc.Slider(
+            0,
+            max(duration, 1),
+            value=0,
+            marks=None,
+            tooltip={"placement": "bottom"},
+            updatemode="mouseup",
+            id='replay_seek'
+        )
+    ]
+
+# live_app.py llena esta caja con replay_controls solo al repetir una sesion
+replay_box = html.Div(id='replay_box')
+
 sidebar = dbc.Stack([
     html.H1("EEG"),
     html.H5("session", id='main_title'),
     html.H5("time", id="time_text"),
+    html.Small(id="event_text"),
+    replay_box,
     html.Hr(),
     dbc.Select(
         ["individual", "todos"],
@@ -136,28 +173,42 @@ heat_graph = html.Div([
 # Create brain visualization component
 brain_graph = create_brain_component()
 
-graphs_ind = dbc.Tabs([
-        dbc.Tab([line_graph], label="lines"),
-        dbc.Tab([bar_graph], label="bars"),
-        dbc.Tab([brain_graph], label="cerebro 3D")
-    ],active_tab="tab-1")
+# Pestañas visibles en cada modo de quantity_select y la que se abre por defecto
+TABS_BY_QUANTITY = {
+    "individual": ("lines-tab", "bars-tab", BRAIN_TAB_ID),
+    "todos": ("heat-tab", BRAIN_TAB_ID),
+}
+DEFAULT_TAB = {
+    "individual": "bars-tab",
+    "todos": "heat-tab",
+}
 
-graphs_all = dbc.Tabs([
-        dbc.Tab([heat_graph], label="heatmap"),
-        dbc.Tab([brain_graph], label="cerebro 3D")
-    ],active_tab="tab-0")
+# Todas las graficas viven siempre en el layout; quantity_select solo oculta
+# pestañas, asi los callbacks de cada tick saben cual esta activa
+graphs = dbc.Tabs([
+        dbc.Tab([line_graph], label="lines", tab_id="lines-tab", id="lines_tab"),
+        dbc.Tab([bar_graph], label="bars", tab_id="bars-tab", id="bars_tab"),
+        dbc.Tab([heat_graph], label="heatmap", tab_id="heat-tab", id="heat_tab", tab_style={"display": "none"}),
+        dbc.Tab([brain_graph], label="cerebro 3D", tab_id=BRAIN_TAB_ID, id="brain_tab")
+    ], id="graphs_tabs", active_tab=DEFAULT_TAB["individual"])
 
 app_layout=html.Div([
     dcc.Store(id='memory'),
+    # Con live_transport = "sse" las muestras llegan por STREAM_URL y el timer no corre
+    dcc.Store(id='live_stream', data=STREAM_URL if Utils.LIVE_TRANSPORT == "sse" else None),
+    dcc.Store(id='live_stream_state'),
+    # {"index":..., "events":[...]} con los eventos de la ultima muestra que los trajo
+    dcc.Store(id='live_events'),
     dcc.Interval(
         id="timer",
         n_intervals=0,
-        interval=1000
+        interval=1000,
+        disabled=Utils.LIVE_TRANSPORT == "sse"
     ),
     offcanvas,
     sidebar,
     html.Div([
         html.H3("sensor", id='sensor_name'),
-        html.Div([], id='graph_box')
+        html.Div([graphs], id='graph_box')
     ], style=styles.MAIN_STYLE)
 ],id='all', style={"display":"flex"})
\ No newline at end of file
@@ -0,0 +1,136 @@
+"""
+Canal de empuje (Server-Sent Events) para la app en vivo.
+
+Con live_transport = "sse" el navegador abre un EventSource contra STREAM_URL
+y el servidor le manda cada muestra del Recorder una sola vez, en cuanto se
+graba; si se grabaron varias entre dos envios (una repeticion rapida o un
+cliente lento) se mandan todas, leidas del historial del Recorder. No hay
+Interval ni peticiones mientras no llegan muestras nuevas, y las graficas de
+lineas, barras y heatmap se extienden en el navegador.
+"""
+
+import json
+
+from dash import Input, Output, State
+from flask import Response, request
+
+STREAM_URL = "/stream"
+
+# Cada cuanto (s) se manda un comentario para que proxies y navegador no cierren la conexion
+KEEPALIVE = 15.0
+
+# Abre el EventSource una sola vez por pagina; cada mensaje actualiza memory y
+# time_text con set_props, lo que dispara los callbacks que dependen de memory,
+# y live_events si la muestra trae eventos
+_OPEN_STREAM_JS = """
+function(url) {
+    if (!url || window.liveStream) {
+        return window.dash_clientside.no_update;
+    }
+    const source = new EventSource(url);
+    source.onmessage = function (event) {
+        const message = JSON.parse(event.data);
+        // time_text primero: los callbacks de memory lo leen como State
+        window.dash_clientside.set_props('time_text', { children: message.index });
+        window.dash_clientside.set_props('memory', { data: message.sample });
+        if (message.events.length) {
+            window.dash_clientside.set_props('live_events', { data: { index: message.index, events: message.events } });
+        }
+    };
+    window.liveStream = source;
+    return 'abierto';
+}
+"""
+
+# Mismo resultado que line_extend, bar_extend y heat_extend de live_app.py,
+# solo para la pestaña visible
+_EXTEND_JS = """
+function(data, activeTab, sensor, checked, sample) {
+    const noUpdate = window.dash_clientside.no_update;
+    const out = [noUpdate, noUpdate, noUpdate];
+    if (!data || data.uid === undefined) {
+        return out;
+    }
+    const sensors = %s;
+    const checkedValues = function () {
+        return Object.keys(data[sensor]).map(function (key) {
+            return [checked.indexOf(key) >= 0 ? data[sensor][key] : null];
+        });
+    };
+    const indices = function (n) {
+        return Array.from({ length: n }, function (_, i) { return i; });
+    };
+
+    if ((activeTab === 'lines-tab' || activeTab === 'bars-tab') && data[sensor]) {
+        const y = checkedValues();
+        if (activeTab === 'lines-tab') {
+            out[0] = [{ x: y.map(function () { return [sample]; }), y: y }, indices(y.length), 15];
+        } else {
+            out[1] = [{ x: indices(y.length).map(function (i) { return [i]; }), y: y }, indices(y.length), 1];
+        }
+    } else if (activeTab === 'heat-tab') {
+        const z = [];
+        sensors.forEach(function (key) {
+            const values = data[key];
+            const ok = values && values.attention !== undefined && values.meditation !== undefined;
+            z.push([[ok ? values.attention : 0]]);
+            z.push([[ok ? values.meditation : 0]]);
+        });
+        out[2] = [{ z: z, y: z.map(function () { return [sample]; }) }, indices(z.length), 30];
+    }
+    return out;
+}
+"""
+
+
+def register_stream(app, recorder, sensors, url:str = STREAM_URL) -> None:
+    '''
+    registra en el servidor Flask de app la ruta url que emite las muestras de
+    recorder, y los callbacks del navegador que la consumen; sensors es la
+    lista de sensores en el orden de las columnas del heatmap
+    '''
+
+    @app.server.route(url)
+    def stream():
+        # al reconectar, EventSource manda el id del ultimo mensaje recibido
+        last_id = request.headers.get("Last-Event-ID", "")
+        after = int(last_id) if last_id.isdigit() else max(recorder.latest()[0] - 1, 0)
+
+        def events(after):
+            while not recorder.is_stopped():
+                index, sample = recorder.wait_for_sample(after, KEEPALIVE)
+                if index > after and sample is not None:
+                    # todas las muestras desde el ultimo envio, no solo la mas reciente
+                    marked = recorder.events_since(after)
+                    for index, sample in recorder.samples_since(after):
+                        names = [event for event_index, event in marked if after < event_index <= index]
+                        message = {'index': index, 'sample': sample, 'events': names}
+                        yield f"id: {index}\ndata: {json.dumps(message)}\n\n"
+                        after = index
+                else:
+                    yield ": keepalive\n\n"
+
+        return Response(
+            events(after),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    app.clientside_callback(
+        _OPEN_STREAM_JS,
+        Output("live_stream_state", "data"),
+        Input("live_stream", "data"),
+    )
+
+    app.clientside_callback(
+        _EXTEND_JS % json.dumps(list(sensors)),
+        Output("line_graph", "extendData", allow_duplicate=True),
+        Output("bar_graph", "extendData", allow_duplicate=True),
+        Output("heat_graph", "extendData", allow_duplicate=True),
+        Input("memory", "data"),
+        State("graphs_tabs", "active_tab"),
+        State("sensor_select", "value"),
+        State("data_checklist", "value"),
+        State("time_text", "children"),
+        prevent_initial_call=True,
+    )
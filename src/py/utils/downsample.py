@@ -0,0 +1,141 @@
+"""
+Reduccion de puntos para las series que se mandan al navegador.
+
+lttb (Largest-Triangle-Three-Buckets) conserva la forma visual de la señal,
+minmax conserva los picos guardando el minimo y el maximo de cada cubeta.
+Todas las funciones devuelven indices sobre los arreglos originales.
+
+Ejecutar `python -m src.py.utils.downsample` corre una comparacion de
+rendimiento y error visual de ambos metodos.
+"""
+
+import numpy as np
+
+METHODS = ("lttb", "minmax")
+
+
+def lttb(x:np.ndarray, y:np.ndarray, n_out:int) -> np.ndarray:
+    '''
+    devuelve los indices de n_out puntos elegidos con LTTB, siempre incluye el
+    primer y el ultimo punto; x debe estar ordenado
+    '''
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # n_out - 2 cubetas para los puntos interiores
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    valid = ~np.isnan(y)
+    counts = np.maximum(np.add.reduceat(valid[1:n - 1], edges[:-1] - 1), 1)
+    avg_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / np.diff(edges)
+    avg_y = np.add.reduceat(np.where(valid, y, 0.0)[1:n - 1], edges[:-1] - 1) / counts
+    # el "siguiente" de la ultima cubeta es el ultimo punto
+    avg_x = np.r_[avg_x[1:], x[-1]]
+    avg_y = np.r_[avg_y[1:], y[-1] if valid[-1] else avg_y[-1]]
+
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a] if valid[a] else avg_y[i]
+        area = np.abs((ax - avg_x[i]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (avg_y[i] - ay))
+        area = np.where(np.isnan(area), -1.0, area)
+        a = lo + int(np.argmax(area))
+        indices[i + 1] = a
+    return indices
+
+
+def minmax(y:np.ndarray, n_out:int) -> np.ndarray:
+    '''
+    divide la serie en n_out / 2 cubetas y devuelve, ordenados, los indices del
+    minimo y del maximo de cada una
+    '''
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n_out >= n or n_out < 2:
+        return np.arange(n)
+
+    size = int(np.ceil(n / (n_out // 2)))
+    buckets = int(np.ceil(n / size))
+    pad = buckets * size - n
+    nan = np.isnan(y)
+    low = np.pad(np.where(nan, np.inf, y), (0, pad), constant_values=np.inf).reshape(buckets, size)
+    high = np.pad(np.where(nan, -np.inf, y), (0, pad), constant_values=-np.inf).reshape(buckets, size)
+
+    offsets = np.arange(buckets) * size
+    pairs = np.stack([low.argmin(axis=1) + offsets, high.argmax(axis=1) + offsets], axis=1)
+    pairs = np.minimum(np.sort(pairs, axis=1), n - 1).ravel()
+    return pairs[np.r_[True, pairs[1:] != pairs[:-1]]]
+
+
+def downsample(x:np.ndarray, y:np.ndarray, n_out:int, method:str = "minmax") -> tuple[np.ndarray, np.ndarray]:
+    '''
+    reduce la serie (x, y) a lo mas n_out puntos con el metodo indicado
+    '''
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if method == "lttb":
+        indices = lttb(x, y, n_out)
+    elif method == "minmax":
+        indices = minmax(y, n_out)
+    else:
+        raise ValueError(f"metodo de reduccion desconocido: {method}")
+    return x[indices], y[indices]
+
+
+def bucket_rows(values:np.ndarray, n_out:int, how:str = "mean") -> tuple[np.ndarray, np.ndarray]:
+    '''
+    agrupa las filas de una matriz (muestras, canales) en n_out cubetas
+    contiguas y devuelve (indice de la primera fila de cada cubeta, matriz
+    reducida), how es "mean" o "max"; los NaN se ignoran
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n_out >= n:
+        return np.arange(n), values
+
+    starts = np.linspace(0, n, n_out, endpoint=False).astype(np.int64)
+    valid = ~np.isnan(values)
+    if how == "max":
+        reduced = np.maximum.reduceat(np.where(valid, values, -np.inf), starts, axis=0)
+        reduced[np.isneginf(reduced)] = np.nan
+    else:
+        counts = np.add.reduceat(valid, starts, axis=0)
+        totals = np.add.reduceat(np.where(valid, values, 0.0), starts, axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            reduced = totals / counts
+    return starts, reduced
+
+
+def _visual_error(x, y, x_small, y_small):
+    '''
+    error medio entre la señal y la interpolacion lineal de la reducida, y
+    fraccion del rango (max - min) que se pierde
+    '''
+    mean_error = np.mean(np.abs(y - np.interp(x, x_small, y_small)))
+    range_kept = (y_small.max() - y_small.min()) / (y.max() - y.min())
+    return mean_error, 1 - range_kept
+
+
+if __name__ == "__main__":
+    import time
+
+    rng = np.random.default_rng(0)
+    n_out = 2000
+    print(f"{'puntos':>10} {'metodo':>8} {'ms':>9} {'Mpts/s':>8} {'err medio':>10} {'rango perdido':>14}")
+    for n in (10_000, 100_000, 1_000_000):
+        x = np.arange(n, dtype=np.float64)
+        # señal tipo EEG: oscilaciones, ruido y picos aislados
+        y = 50 + 20 * np.sin(x / 300) + 5 * rng.standard_normal(n)
+        y[rng.integers(0, n, n // 5000)] += 60
+
+        for method in METHODS:
+            start = time.perf_counter()
+            x_small, y_small = downsample(x, y, n_out, method)
+            elapsed = time.perf_counter() - start
+            error, lost = _visual_error(x, y, x_small, y_small)
+            print(f"{n:>10} {method:>8} {elapsed * 1000:>9.2f} {n / elapsed / 1e6:>8.1f} {error:>10.3f} {lost:>14.2%}")
@@ -0,0 +1,155 @@
+"""
+Memoizacion de las figuras del explorador.
+
+Una sesion terminada no cambia, asi que la figura que sale de los mismos
+parametros, sensores y resolucion es siempre la misma. FigureCache guarda el
+JSON ya serializado de cada figura en un LRU en memoria y, si se configura un
+directorio, tambien en disco para que sobreviva a reiniciar app.py; los
+archivos en disco tienen su propio limite y se borran primero los que hace mas
+tiempo que no se usan.
+
+Cada entrada lleva la version de la sesion (ver Database.session_version): si
+se graban muestras, eventos o notas nuevas la version cambia y la figura se
+vuelve a construir y el archivo viejo se borra.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+def digest(value) -> str:
+    '''
+    huella corta y estable de una llave o version (tuplas de valores simples)
+    '''
+    return hashlib.sha1(repr(value).encode()).hexdigest()
+
+
+class FigureCache:
+    """
+    LRU de figuras serializadas con limite en bytes y copia opcional en disco.
+    """
+
+    def __init__(self, max_bytes:int, directory:str = None, max_disk_bytes:int = None) -> None:
+        '''
+        max_bytes es el total de JSON en memoria, directory donde se guardan
+        las figuras en disco (None para no usar disco) y max_disk_bytes el
+        total de los archivos en directory, por defecto igual a max_bytes
+        '''
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_bytes if max_disk_bytes is None else max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self._figures = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key_digest:str) -> str:
+        return os.path.join(self.directory, f"{key_digest}.json")
+
+    def _remember(self, key_digest:str, version:str, text:str) -> None:
+        with self._lock:
+            previous = self._figures.pop(key_digest, None)
+            if previous is not None:
+                self._bytes -= len(previous[1])
+            self._figures[key_digest] = (version, text)
+            self._bytes += len(text)
+            while self._bytes > self.max_bytes and len(self._figures) > 1:
+                _, (_, evicted) = self._figures.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def _lookup(self, key_digest:str, version:str) -> str:
+        with self._lock:
+            entry = self._figures.get(key_digest)
+            if entry is not None and entry[0] == version:
+                self._figures.move_to_end(key_digest)
+                return entry[1]
+
+        if self.directory is None:
+            return None
+        path = self._path(key_digest)
+        try:
+            with open(path) as file:
+                stored = json.load(file)
+        except OSError:
+            return None
+        except ValueError:
+            stored = {}
+        if stored.get("version") != version:
+            # figura de una version anterior de la sesion (o archivo dañado), no se vuelve a usar
+            self._remove(path)
+            return None
+        # la fecha de modificacion marca el ultimo uso para _trim_disk
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._remember(key_digest, version, stored["figure"])
+        return stored["figure"]
+
+    def _remove(self, path:str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _trim_disk(self, keep:str) -> None:
+        # borra los archivos usados hace mas tiempo hasta quedar bajo max_disk_bytes,
+        # keep (el que se acaba de guardar) se queda aunque solo pase del limite
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json") and entry.is_file() and entry.path != keep:
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files) + os.path.getsize(keep)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def get(self, key:tuple, version:tuple, build) -> dict:
+        '''
+        devuelve la figura de key como diccionario listo para un Output de
+        Dash; si no esta guardada para esta version llama build(), que debe
+        devolver una go.Figure, y guarda su JSON
+        '''
+        key_digest, version = digest(key), digest(version)
+        text = self._lookup(key_digest, version)
+        if text is not None:
+            self.hits += 1
+            return json.loads(text)
+
+        self.misses += 1
+        text = build().to_json()
+        self._remember(key_digest, version, text)
+        if self.directory is not None:
+            try:
+                # se escribe aparte y se renombra para no dejar archivos a medias
+                path = self._path(key_digest)
+                with open(f"{path}.tmp", "w") as file:
+                    json.dump({"version": version, "figure": text}, file)
+                os.replace(f"{path}.tmp", path)
+                self._trim_disk(keep=path)
+            except OSError as e:
+                print(f'No se pudo guardar la figura en {self.directory}: {e}')
+        return json.loads(text)
+
+    def clear(self, disk:bool = False) -> None:
+        '''
+        vacia la memoria y, con disk=True, borra tambien los archivos de
+        directory; sin disk los archivos se quedan hasta que se lean con otra
+        version o los saque el limite max_disk_bytes
+        '''
+        with self._lock:
+            self._figures.clear()
+            self._bytes = 0
+        if disk and self.directory is not None:
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".json"):
+                    self._remove(entry.path)
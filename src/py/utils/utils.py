@@ -3,9 +3,12 @@ import dash_bootstrap_components as dbc
 import requests
 import numpy as np
 import json
+import pandas as pd
 from dash import Input, Output, State
 import re
 from datetime import datetime
+from src.py.database.rollups import ROLLUP_WIDTHS
+from src.py.utils.downsample import downsample, bucket_rows
 
 class Utils:
 
@@ -25,31 +28,95 @@ class Utils:
 
         DATABASE_PATH = config["database_path"]
 
+        # Tiempo maximo (s) que espera un tick de sondeo por todos los sensores
+        POLL_DEADLINE = config.get("poll_deadline", 0.9)
 
-    def get_data(sensor: str) -> np.ndarray:
+        # Periodo (s) con el que el Recorder toma y guarda una muestra
+        SAMPLE_INTERVAL = config.get("sample_interval", 1.0)
+
+        # Forma de guardar las sesiones nuevas: "wide" o "long" (ver Database)
+        STORAGE_LAYOUT = config.get("storage_layout", "wide")
+
+        # Maximo de puntos por serie en las graficas del explorador
+        PLOT_MAX_POINTS = config.get("plot_max_points", 4000)
+
+        # Metodo para reducir las series que pasan de PLOT_MAX_POINTS: "minmax" o "lttb"
+        PLOT_DOWNSAMPLE = config.get("plot_downsample", "minmax")
+
+        # Como se dibujan las lineas del explorador: "webgl" (Scattergl) o "svg" (Scatter)
+        PLOT_RENDERER = config.get("plot_renderer", "webgl")
+
+        # Columnas (ancho en pixeles) del heatmap del explorador
+        HEAT_RASTER_WIDTH = config.get("heat_raster_width", 1200)
+
+        # Como se agregan las muestras de cada columna del heatmap: "mean" o "max"
+        HEAT_AGGREGATE = config.get("heat_aggregate", "mean")
+
+        # Memoria (MB) para las sesiones que el explorador mantiene cargadas
+        SESSION_CACHE_MB = config.get("session_cache_mb", 256)
+
+        # Memoria (MB) para las figuras ya serializadas del explorador
+        FIGURE_CACHE_MB = config.get("figure_cache_mb", 64)
+
+        # Carpeta donde el explorador guarda las figuras entre ejecuciones, null para no usar disco
+        FIGURE_CACHE_DIR = config.get("figure_cache_dir", None)
+
+        # Limite en MB de las figuras guardadas en figure_cache_dir
+        FIGURE_CACHE_DISK_MB = config.get("figure_cache_disk_mb", 256)
+
+        # Malla con la que arranca el cerebro 3D: "fsaverage5", "fsaverage6" o "fsaverage"
+        BRAIN_LOD = config.get("brain_lod", "fsaverage")
+
+        # Como se mandan las intensidades del cerebro: "float", "u1" (uint8) o "u2" (uint16)
+        BRAIN_INTENSITY_ENCODING = config.get("brain_intensity_encoding", "u1")
+
+        # Donde se calculan las intensidades del cerebro en cada tick: "server" o "client"
+        BRAIN_RENDER_MODE = config.get("brain_render_mode", "server")
+
+        # Como llegan las muestras a la app en vivo: "sse" (el servidor las empuja) o "poll" (Interval)
+        LIVE_TRANSPORT = config.get("live_transport", "sse")
+
+
+    def fetch_data(sensor: str, timeout: float = 0.5) -> np.ndarray:
         '''
         luego de definir un sensor con el ip y puerto correspondientes, e.g.
 
         'http://192.168.1.12:105/'
 
         manda una instruccion de GET al servidor que establece el sensor, para
-        recibir la informacion del sens or
+        recibir la informacion del sensor
 
         espera una respuesta en JSON de tipo
         
         {"data":"[0.8014442490425848, 0.12287946936057148, ...]"}
 
-        si no se obtiene, devuelve datos simulados para testing
+        si el sensor no responde en timeout segundos o la respuesta no es
+        valida lanza la excepcion, sin datos de reemplazo
+        '''
+        request = requests.get(sensor, stream=True, timeout=timeout)
+        request.raise_for_status()
+        return np.array(
+            request.json()['data']
+        )
+
+    def get_data(sensor: str) -> np.ndarray:
+        '''
+        igual que fetch_data, pero si no se obtiene la lectura devuelve datos
+        simulados para testing
         '''
         try:
-            request = requests.get(sensor, stream=True, timeout=0.5)
-            return np.array(
-                request.json()['data']
-            )
+            return Utils.fetch_data(sensor)
         except:
             print(f'Hay un problema con {sensor} - usando datos simulados')
             # En lugar de devolver None, devolver datos simulados realistas
-            return np.random.uniform(20, 80, size=len(Utils.SENSOR_PARAMS))
+            return Utils.simulated_data()
+
+    def simulated_data() -> np.ndarray:
+        '''
+        devuelve una lectura simulada con un valor por parametro, la usa
+        get_data cuando un sensor no responde
+        '''
+        return np.random.uniform(20, 80, size=len(Utils.SENSOR_PARAMS))
             
 
     def avg_data(*arrays: np.ndarray) -> np.ndarray:
@@ -160,48 +227,176 @@ def get_date(name:int)->datetime:
         r'%Y%m%d%H%M%S'
     ).strftime(r"%c")
 
-def static_line_plot_factory(uid, db, checked, sensors):
+# Hasta cuantas veces PLOT_MAX_POINTS se leen muestras crudas para reducirlas
+# en memoria; con mas muestras conviene leer los resumenes
+RAW_READ_FACTOR = 10
+
+def load_plot_frame(uid, db, start, stop, columns, max_points=None, envelope=False):
+    '''
+    devuelve las columnas pedidas de la sesion entre los samples start y stop,
+    indexadas por sample
+
+    hasta RAW_READ_FACTOR * max_points muestras se leen crudas (y se reducen
+    despues al graficar), con mas se usa el resumen mas fino que no pase de
+    max_points puntos, calculando los resumenes si la sesion no los tiene;
+    con envelope=True cada cubeta aporta su minimo y su maximo en lugar del
+    promedio
+    '''
+    max_points = Utils.PLOT_MAX_POINTS if max_points is None else max_points
+    if stop - start <= max_points * RAW_READ_FACTOR:
+        return db.get_session(uid, start, stop).loc[:,columns]
+
+    if not db.has_rollups(uid):
+        db.backfill_rollups(uid)
+
+    budget = max_points // 2 if envelope else max_points
+    for width in ROLLUP_WIDTHS:
+        if db.rollup_bucket_count(uid, width, start, stop) <= budget:
+            break
+    rollup = db.get_rollup(uid, width, start, stop, columns)
+    if not envelope:
+        return rollup["mean"]
+    return pd.concat([rollup["min"], rollup["max"]]).sort_index(kind="stable")
+
+def relayout_x_range(relayout_data):
+    '''
+    extrae el rango visible del eje x de un relayoutData de plotly
+
+    devuelve (x0, x1) si se hizo zoom, "auto" si se reinicio la vista con
+    doble click y None si el cambio no toca el eje x
+    '''
+    if not relayout_data:
+        return None
+    if relayout_data.get("xaxis.autorange"):
+        return "auto"
+    if "xaxis.range[0]" in relayout_data and "xaxis.range[1]" in relayout_data:
+        return relayout_data["xaxis.range[0]"], relayout_data["xaxis.range[1]"]
+    if "xaxis.range" in relayout_data:
+        return tuple(relayout_data["xaxis.range"])
+    return None
+
+def channel_columns(sensors, params):
+    '''
+    nombres exactos de las columnas "{parametro}{sensor}" de los sensores y
+    parametros dados, agrupadas por parametro
+    '''
+    return [f"{param}{Utils.SENSORS_MAP[sensor]}" for param in params for sensor in sensors]
+
+def event_trace(events, event_types=None, x_range=None):
+    '''
+    una sola traza con una linea vertical por evento, separadas por NaN, en
+    el eje y2 (de 0 a 1 sobre la grafica) y con el nombre del evento al
+    pasar el mouse; solo incluye los eventos de event_types (todos si es
+    None) dentro de x_range
+    '''
+    times = events["time"].to_numpy(dtype=np.float64)
+    names = events["event"].astype(str).to_numpy()
+    keep = np.ones(len(times), dtype=bool)
+    if event_types is not None:
+        keep &= np.isin(names, list(event_types))
+    if x_range is not None:
+        keep &= (times >= x_range[0]) & (times <= x_range[1])
+    times, names = times[keep], names[keep]
+
+    # cada evento es (t, 0) -> (t, 1) seguido de un NaN que corta la linea
+    x = np.repeat(times, 3)
+    x[2::3] = np.nan
+    y = np.tile([0.0, 1.0, np.nan], len(times))
+    return go.Scatter(
+        x=x,
+        y=y,
+        text=np.repeat(names, 3),
+        yaxis="y2",
+        mode="lines+markers",
+        line={"color":"gray", "dash":"dot", "width":1},
+        marker={"size":4, "color":"gray"},
+        name="eventos",
+        showlegend=False,
+        hovertemplate="%{text}<br>%{x}<extra></extra>"
+    )
 
-    line_figure = go.Figure()
+# Eje de los eventos: encima del eje y principal, fijo de 0 a 1 y sin etiquetas
+EVENT_AXIS = {"overlaying":"y", "range":[0, 1], "visible":False, "fixedrange":True}
 
-    index=[]
-    for sensor in sensors:
-        index += map(
-            lambda x:x+str(Utils.SENSORS_MAP[sensor]),
-            Utils.SENSOR_PARAMS
-        )
+def static_line_plot_factory(session, checked, sensors, x_range=None, event_types=None):
+    '''
+    grafica las señales marcadas de una LoadedSession entre el primer y el
+    ultimo evento; con x_range=(x0, x1) solo se usan las muestras visibles, a
+    la resolucion de plot_max_points
+
+    cada columna es una traza con su propio color y entrada en la leyenda,
+    agrupadas por parametro; con plot_renderer = "webgl" se dibujan con
+    Scattergl. Los eventos de event_types (todos si es None) van en una sola traza
+    '''
+    uid, events = session.uid, session.events
+
+    line_figure = go.Figure()
+    trace = go.Scattergl if Utils.PLOT_RENDERER == "webgl" else go.Scatter
 
-    events = db.get_events(uid)
-    session = db.get_session(uid, events.iloc[0, 0], events.iloc[-1,0]).loc[:,index]
+    params = [param for param in checked if param in Utils.SENSOR_PARAMS]
+    index = channel_columns(sensors, params)
 
-    for wave in checked:
+    start, stop = session.start, session.stop
+    if x_range is not None:
+        start = max(start, int(np.floor(x_range[0])))
+        stop = max(min(stop, int(np.ceil(x_range[1])) + 1), start + 1)
+    frame = session.frame(index, start, stop, envelope=Utils.PLOT_DOWNSAMPLE == "minmax")
 
-        for name, data in session.items():
-            if wave in name:
-                line_figure.add_trace(
-                    go.Scatter(
-                        x=session.index,
-                        y=data,
-                        name=name
-                    )
+    for param in params:
+        for sensor in sensors:
+            name = f"{param}{Utils.SENSORS_MAP[sensor]}"
+            x, y = downsample(frame.index, frame[name], Utils.PLOT_MAX_POINTS, Utils.PLOT_DOWNSAMPLE)
+            line_figure.add_trace(
+                trace(
+                    x=x,
+                    y=y,
+                    mode="lines",
+                    name=name,
+                    legendgroup=param
                 )
+            )
         
-    for time, event in events.loc[:,["time", "event"]].values:
-        line_figure.add_vline(time, annotation_text=event)
+    line_figure.add_trace(event_trace(events, event_types, (start, stop)))
 
+    # el zoom se resuelve en el servidor (ver zoom_lines en app.py), sin rangeslider
     line_figure.update_layout(
         {
             "xaxis":{
-                "rangeslider":{
-                    "visible":True
-                }
-            }
+                "range":list(x_range) if x_range is not None else None
+            },
+            "yaxis2":EVENT_AXIS,
+            "uirevision":uid
         }
     )
     
     return line_figure
 
-def static_heat_plot_factory(uid, db, checked, sensors):
+def heat_raster(frame, bounds, width=None, how=None):
+    '''
+    reduce un DataFrame (muestras, canales) a una matriz de a lo mas width
+    columnas agregando cada cubeta de muestras con how ("mean" o "max"), y la
+    normaliza a uint8 (0 a 255) con bounds = (minimo, maximo) por canal
+
+    devuelve (x de cada columna, z con forma (canales, columnas)); los huecos
+    sin datos quedan en 0
+    '''
+    width = Utils.HEAT_RASTER_WIDTH if width is None else width
+    how = Utils.HEAT_AGGREGATE if how is None else how
+    starts, reduced = bucket_rows(frame.to_numpy(), width, how)
+    low, high = (np.asarray(bound, dtype=np.float64) for bound in bounds)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        scaled = (reduced - low) / (high - low)
+    z = np.nan_to_num(np.clip(scaled, 0, 1) * 255).round().astype(np.uint8)
+    return frame.index[starts], z.transpose()
+
+def static_heat_plot_factory(session, checked, sensors, x_range=None, event_types=None):
+    '''
+    heatmap de todos los parametros de los sensores, normalizado por canal
+    con el minimo y maximo de toda la sesion; se manda como una matriz uint8
+    de a lo mas heat_raster_width columnas, asi el tamaño depende del ancho
+    de la pantalla y no de la duracion. Con x_range=(x0, x1) se vuelve a
+    agregar solo el rango visible; los eventos van como en las lineas
+    '''
 
     graph_figure = go.Figure()
 
@@ -212,35 +407,37 @@ def static_heat_plot_factory(uid, db, checked, sensors):
             Utils.SENSOR_PARAMS
         )
 
-    events = db.get_events(uid)
-    session = db.get_session(uid, events.iloc[0, 0], events.iloc[-1,0]).loc[:,index]
-    normalized=(session-session.min())/(session.max()-session.min())
-
-    # for wave in checked:
-
-    #     for name, data in session.items():
-    #         if wave in name:
-    #             ...
+    events = session.events
+    overview = session.frame(index)
+    start, stop = session.start, session.stop
+    if x_range is not None:
+        start = max(start, int(np.floor(x_range[0])))
+        stop = max(min(stop, int(np.ceil(x_range[1])) + 1), start + 1)
+    frame = session.frame(index, start, stop)
+    x, z = heat_raster(frame, (overview.min(), overview.max()))
 
     graph_figure.add_trace(
         go.Heatmap(
-            x=session.index,
-            y=session.columns,
-            z=normalized.transpose(),
-            colorscale="deep"
+            x=x,
+            y=frame.columns,
+            z=z,
+            zmin=0,
+            zmax=255,
+            colorscale="deep",
+            colorbar={"tickvals":[0, 127.5, 255], "ticktext":["0", "0.5", "1"]}
         )
     )
         
-    for time, event in events.loc[:,["time", "event"]].values:
-        graph_figure.add_vline(time, annotation_text=event)
+    graph_figure.add_trace(event_trace(events, event_types, (start, stop)))
 
+    # el zoom se resuelve en el servidor (ver zoom_heat en app.py), sin rangeslider
     graph_figure.update_layout(
         {
             "xaxis":{
-                "rangeslider":{
-                    "visible":True
-                }
-            }
+                "range":list(x_range) if x_range is not None else None
+            },
+            "yaxis2":EVENT_AXIS,
+            "uirevision":session.uid
         }
     )
     
@@ -0,0 +1,213 @@
+'''
+Pruebas de Database sobre un archivo SQLite temporal
+
+se corren desde la raiz del proyecto con un config.json (basta con copiar
+config_template.json), p.ej.
+python -m unittest discover testing
+'''
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from src.py.acquisition.replay import ReplaySource
+from src.py.database.database import Database, LONG, WIDE
+from src.py.utils.utils import Utils
+
+UID = 20240101120000
+START = 1700000000.0
+
+
+def readings(sample:int) -> list[np.ndarray]:
+    '''
+    una lectura por sensor con valores distintos en cada muestra y canal
+    '''
+    return [
+        np.arange(len(Utils.SENSOR_PARAMS), dtype=np.float64) + 100 * sensor + sample
+        for sensor in range(len(Utils.SENSORS))
+    ]
+
+
+class DatabaseTestCase(unittest.TestCase):
+    '''
+    abre una base nueva en un directorio temporal para cada prueba
+    '''
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "test.db")
+        self.header = Database.get_params_header(Utils.SENSORS.values(), Utils.SENSOR_PARAMS)
+        self.dbs = []
+
+    def tearDown(self) -> None:
+        for db in self.dbs:
+            db.close()
+        self.tmp.cleanup()
+
+    def open(self, layout:str = WIDE, **kwargs) -> Database:
+        db = Database(self.path, layout=layout, **kwargs)
+        self.dbs.append(db)
+        return db
+
+    def record(self, db:Database, samples:int, period:float = 1.0, uid:int = UID) -> None:
+        if not db.session_exists(uid):
+            db.create_session(uid, self.header)
+        for sample in range(samples):
+            db.record_data(uid, self.header, readings(sample), sample, START + sample * period)
+
+
+class TestSessionLayouts(DatabaseTestCase):
+    '''
+    una sesion se encuentra y se repite aunque layout sea el de la otra forma
+    '''
+    def check_other_layout(self, recorded:str, configured:str) -> None:
+        db = self.open(recorded)
+        self.record(db, 5)
+        db.close()
+
+        db = self.open(configured)
+        self.assertTrue(db.session_exists(UID))
+        self.assertEqual(db.session_layout(UID), recorded)
+        self.assertFalse(db.session_exists(UID + 1))
+
+        source = ReplaySource(db, UID)
+        values, missed = source.poll()
+        self.assertEqual(missed, [])
+        np.testing.assert_array_equal(np.concatenate(values), np.concatenate(readings(0)))
+        self.assertEqual(source.last_timestamp, START)
+
+    def test_wide_session_with_long_config(self):
+        self.check_other_layout(WIDE, LONG)
+
+    def test_long_session_with_wide_config(self):
+        self.check_other_layout(LONG, WIDE)
+
+
+class TestWriteBehind(DatabaseTestCase):
+    '''
+    cola de record_data y reintento fila por fila de un lote que falla
+    '''
+    def rollup_counts(self, db:Database, width:int = 10) -> set[int]:
+        with db._read() as conn:
+            return {n for (n,) in conn.execute(
+                'SELECT "n" FROM "rollups" WHERE "session" = ? AND "width" = ?', (UID, width)
+            )}
+
+    def test_flush_drains_queue(self):
+        db = self.open(flush_rows=3)
+        self.record(db, 10)
+        db.flush()
+        self.assertTrue(db._pending.empty())
+        self.assertEqual(db.sample_bounds(UID), (0, 10))
+
+    def test_close_drains_queue(self):
+        db = self.open(flush_interval=60)
+        self.record(db, 10)
+        db.close()
+        self.assertEqual(self.open().sample_bounds(UID), (0, 10))
+
+    def check_failed_batch(self, layout:str) -> None:
+        # un intervalo largo junta las cuatro filas en un solo lote
+        db = self.open(layout, flush_interval=60, flush_rows=4)
+        self.record(db, 3)
+        db.record_data(UID, self.header, readings(1), 1, START + 1)
+
+        with self.assertRaises(sqlite3.IntegrityError):
+            db.flush()
+        self.assertEqual(db.write_errors, 1)
+        self.assertEqual(db.sample_bounds(UID), (0, 3))
+        self.assertEqual(len(db.get_session(UID, 0, 10)), 3)
+        # la fila repetida no cuenta en los resumenes
+        self.assertEqual(self.rollup_counts(db), {3})
+
+    def test_failed_batch_wide(self):
+        self.check_failed_batch(WIDE)
+
+    def test_failed_batch_long(self):
+        self.check_failed_batch(LONG)
+
+
+class TestReads(DatabaseTestCase):
+    '''
+    las formas WIDE y LONG devuelven lo mismo
+    '''
+    def recorded(self, layout:str) -> Database:
+        self.path = os.path.join(self.tmp.name, f"{layout}.db")
+        db = self.open(layout)
+        self.record(db, 30)
+        db.flush()
+        return db
+
+    def test_wide_and_long_frames_match(self):
+        wide, long = self.recorded(WIDE), self.recorded(LONG)
+        self.assertEqual(long.session_layout(UID), LONG)
+
+        pd.testing.assert_frame_equal(
+            wide.get_session(UID, 5, 25), long.get_session(UID, 5, 25), check_dtype=False
+        )
+        pd.testing.assert_frame_equal(
+            wide.get_session_range(UID, START + 3, START + 12),
+            long.get_session_range(UID, START + 3, START + 12),
+            check_dtype=False
+        )
+        name = f"{Utils.SENSOR_PARAMS[1]}1"
+        pd.testing.assert_series_equal(
+            wide.get_channel(UID, 1, Utils.SENSOR_PARAMS[1], 5, 25),
+            long.get_channel(UID, 1, Utils.SENSOR_PARAMS[1], 5, 25),
+            check_dtype=False
+        )
+        self.assertEqual(wide.get_channel(UID, 1, Utils.SENSOR_PARAMS[1]).name, name)
+
+
+class TestRollups(DatabaseTestCase):
+    '''
+    los resumenes que se van guardando al grabar son iguales a recalcularlos
+    '''
+    def check_backfill(self, layout:str) -> None:
+        # varios lotes pequeños para que las cubetas se combinen al insertar
+        db = self.open(layout, flush_rows=7)
+        self.record(db, 200, period=0.7)
+        db.flush()
+
+        for width in (10, 60):
+            incremental = db.get_rollup(UID, width, 0, 200)
+            db.backfill_rollups(UID)
+            backfilled = db.get_rollup(UID, width, 0, 200)
+            self.assertGreater(len(incremental), 1)
+            pd.testing.assert_frame_equal(incremental, backfilled)
+
+    def test_bucket_straddling_start(self):
+        db = self.open()
+        self.record(db, 40)
+        db.flush()
+        # las cubetas de 10 s empiezan en 0, 10, 20 y 30
+        self.assertEqual(db.rollup_bucket_count(UID, 10, 5, 25), 3)
+        self.assertEqual(list(db.get_rollup(UID, 10, 5, 25).index), [0, 10, 20])
+
+    def test_bucket_count_with_missed_sensor(self):
+        db = self.open()
+        db.create_session(UID, self.header)
+        for sample in range(100):
+            values = readings(sample)
+            if sample >= 10:
+                # el primer sensor deja de responder despues de la primera cubeta
+                values[0] = np.full(len(Utils.SENSOR_PARAMS), np.nan)
+            db.record_data(UID, self.header, values, sample, START + sample)
+        db.flush()
+
+        self.assertEqual(db.rollup_bucket_count(UID, 10, 0, 100), 10)
+        rollup = db.get_rollup(UID, 10, 0, 100)
+        self.assertEqual(len(rollup), 10)
+        self.assertTrue(rollup["mean"][f"{Utils.SENSOR_PARAMS[0]}0"].iloc[1:].isna().all())
+
+    def test_backfill_matches_wide(self):
+        self.check_backfill(WIDE)
+
+    def test_backfill_matches_long(self):
+        self.check_backfill(LONG)
+
+
+if __name__ == "__main__":
+    unittest.main()
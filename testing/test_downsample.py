@@ -0,0 +1,56 @@
+'''
+Pruebas de la reduccion de puntos de las graficas
+'''
+import unittest
+
+import numpy as np
+
+from src.py.utils.downsample import bucket_rows, downsample, lttb, minmax
+
+
+class TestDownsample(unittest.TestCase):
+    '''
+    lttb, minmax y bucket_rows sobre una señal con picos aislados
+    '''
+    def setUp(self) -> None:
+        rng = np.random.default_rng(0)
+        self.x = np.arange(10000, dtype=np.float64)
+        self.y = 50 + 20 * np.sin(self.x / 300) + 5 * rng.standard_normal(len(self.x))
+        self.y[[1234, 7777]] = [200, -100]
+
+    def test_lttb_keeps_first_and_last(self):
+        indices = lttb(self.x, self.y, 500)
+        self.assertEqual(len(indices), 500)
+        self.assertEqual(indices[0], 0)
+        self.assertEqual(indices[-1], len(self.x) - 1)
+        self.assertTrue(np.all(np.diff(indices) > 0))
+
+    def test_minmax_keeps_extremes(self):
+        indices = minmax(self.y, 500)
+        self.assertLessEqual(len(indices), 500)
+        self.assertTrue(np.all(np.diff(indices) > 0))
+        self.assertIn(1234, indices)
+        self.assertIn(7777, indices)
+        self.assertEqual(self.y[indices].max(), self.y.max())
+        self.assertEqual(self.y[indices].min(), self.y.min())
+
+    def test_short_series_unchanged(self):
+        x, y = downsample(self.x[:100], self.y[:100], 500, "lttb")
+        np.testing.assert_array_equal(y, self.y[:100])
+        with self.assertRaises(ValueError):
+            downsample(self.x, self.y, 500, "promedio")
+
+    def test_bucket_rows(self):
+        values = np.arange(20, dtype=np.float64).reshape(10, 2)
+        values[1, 0] = np.nan
+        starts, reduced = bucket_rows(values, 5, "mean")
+        np.testing.assert_array_equal(starts, [0, 2, 4, 6, 8])
+        np.testing.assert_array_equal(reduced[:, 1], [2, 6, 10, 14, 18])
+        # los NaN no cuentan para el promedio
+        self.assertEqual(reduced[0, 0], 0)
+        starts, reduced = bucket_rows(values, 5, "max")
+        np.testing.assert_array_equal(reduced[:, 1], [3, 7, 11, 15, 19])
+
+
+if __name__ == "__main__":
+    unittest.main()
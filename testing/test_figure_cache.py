@@ -0,0 +1,82 @@
+'''
+Pruebas del cache de figuras del explorador
+'''
+import os
+import tempfile
+import unittest
+
+import plotly.graph_objects as go
+
+from src.py.utils.figure_cache import FigureCache, digest
+
+
+def figure(points:int):
+    return go.Figure(go.Scatter(x=list(range(points)), y=list(range(points))))
+
+
+class TestFigureCache(unittest.TestCase):
+    '''
+    las figuras se construyen una vez por version y el disco respeta su limite
+    '''
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.builds = []
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def build(self, points:int = 10):
+        def build():
+            self.builds.append(points)
+            return figure(points)
+        return build
+
+    def test_memoized_until_version_changes(self):
+        cache = FigureCache(2**20)
+        first = cache.get(("lines", 1), (0, 10), self.build())
+        self.assertEqual(cache.get(("lines", 1), (0, 10), self.build()), first)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        cache.get(("lines", 1), (0, 11), self.build())
+        self.assertEqual(len(self.builds), 2)
+
+    def test_disk_copy_survives_restart_and_is_invalidated(self):
+        directory = self.tmp.name
+        FigureCache(2**20, directory).get(("lines", 1), (0, 10), self.build())
+        path = os.path.join(directory, f"{digest(('lines', 1))}.json")
+        self.assertTrue(os.path.exists(path))
+
+        cache = FigureCache(2**20, directory)
+        cache.get(("lines", 1), (0, 10), self.build())
+        self.assertEqual((cache.hits, len(self.builds)), (1, 1))
+
+        # con otra version el archivo viejo se borra y se reemplaza
+        FigureCache(2**20, directory).get(("lines", 1), (0, 11), self.build())
+        self.assertEqual(len(self.builds), 2)
+        self.assertEqual(len(os.listdir(directory)), 1)
+
+    def test_memory_limit(self):
+        size = len(figure(100).to_json())
+        cache = FigureCache(int(size * 2.5))
+        for key in range(4):
+            cache.get(key, 0, self.build(100))
+        self.assertEqual(list(cache._figures), [digest(2), digest(3)])
+        self.assertLessEqual(cache._bytes, cache.max_bytes)
+
+    def test_disk_trim_removes_least_recently_used(self):
+        directory = self.tmp.name
+        size = len(figure(100).to_json())
+        cache = FigureCache(2**20, directory, max_disk_bytes=int(size * 2.5))
+        for key in range(3):
+            cache.get(key, 0, self.build(100))
+            # fechas de ultimo uso distintas aunque el sistema de archivos sea poco preciso
+            os.utime(os.path.join(directory, f"{digest(key)}.json"), (key, key))
+
+        files = sorted(os.listdir(directory))
+        self.assertEqual(files, sorted(f"{digest(key)}.json" for key in (1, 2)))
+        total = sum(os.path.getsize(os.path.join(directory, name)) for name in files)
+        self.assertLessEqual(total, cache.max_disk_bytes)
+
+
+if __name__ == "__main__":
+    unittest.main()
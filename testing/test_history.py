@@ -0,0 +1,68 @@
+'''
+Pruebas del historial en memoria de la sesion en vivo
+'''
+import unittest
+
+import numpy as np
+
+from src.py.acquisition.history import SessionHistory
+
+SENSORS = ("sensor_a", "sensor_b")
+PARAMS = ("attention", "meditation")
+START = 1700000000.0
+
+
+class TestSessionHistory(unittest.TestCase):
+    '''
+    buffer circular de capacidad fija
+    '''
+    def setUp(self) -> None:
+        self.history = SessionHistory(1, SENSORS, PARAMS, capacity=5)
+
+    def append(self, samples) -> None:
+        for sample in samples:
+            self.history.append(sample, START + sample, [np.array([sample, -sample])] * len(SENSORS))
+
+    def test_wraparound_keeps_latest(self):
+        self.append(range(8))
+        self.assertEqual(len(self.history), 5)
+        np.testing.assert_array_equal(self.history.times(), [3, 4, 5, 6, 7])
+        self.assertEqual(self.history.at(0)[:2], (3, 3.0))
+        sample, seconds, memory = self.history.at(-1)
+        self.assertEqual((sample, seconds), (7, 7.0))
+        self.assertEqual(memory["sensor_b"], {"attention": 7.0, "meditation": -7.0})
+        with self.assertRaises(IndexError):
+            self.history.at(5)
+
+    def test_after(self):
+        self.append(range(8))
+        self.assertEqual([sample for sample, _ in self.history.after(5)], [6, 7])
+        # las muestras que ya salieron del buffer no se devuelven
+        self.assertEqual([sample for sample, _ in self.history.after(-1)], [3, 4, 5, 6, 7])
+        self.assertEqual(self.history.after(7), [])
+
+    def test_nearest(self):
+        self.assertIsNone(self.history.nearest(1))
+        self.append(range(8))
+        self.assertEqual(self.history.nearest(5.4), 2)
+        self.assertEqual(self.history.nearest(100), 4)
+        self.assertEqual(self.history.nearest(0), 0)
+
+    def test_missing_values(self):
+        self.history.append(0, START, [np.array([10.0, np.nan])])
+        memory = self.history.at(-1)[2]
+        # los NaN y el sensor sin lectura no aparecen en memory
+        self.assertEqual(memory["sensor_a"], {"attention": 10.0})
+        self.assertEqual(memory["sensor_b"], {})
+        self.assertEqual(self.history.averages(["attention", "meditation"]), [10.0, 0.0])
+
+    def test_clear_keeps_start(self):
+        self.append(range(3))
+        self.history.clear()
+        self.assertEqual(len(self.history), 0)
+        self.append([10])
+        np.testing.assert_array_equal(self.history.times(), [10])
+
+
+if __name__ == "__main__":
+    unittest.main()
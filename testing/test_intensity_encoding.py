@@ -0,0 +1,56 @@
+'''
+Pruebas de la cuantizacion de las intensidades del cerebro 3D
+'''
+import base64
+import unittest
+
+import numpy as np
+
+from src.py.brain_viz.intensity_encoding import (
+    INTENSITY_MAX, INTENSITY_MIN, color_range, dequantize, encode_intensity, levels, quantize
+)
+
+
+class TestIntensityEncoding(unittest.TestCase):
+    '''
+    quantize y dequantize pierden a lo mas medio escalon dentro de [-6, 6]
+    '''
+    def setUp(self) -> None:
+        self.values = np.linspace(INTENSITY_MIN, INTENSITY_MAX, 10001)
+
+    def check_round_trip(self, encoding:str) -> None:
+        quantized = quantize(self.values, encoding)
+        self.assertEqual(quantized.dtype.str[1:], encoding)
+        self.assertEqual(quantized.min(), 0)
+        self.assertEqual(quantized.max(), levels(encoding))
+
+        step = (INTENSITY_MAX - INTENSITY_MIN) / levels(encoding)
+        error = np.abs(dequantize(quantized, encoding) - self.values)
+        self.assertLessEqual(error.max(), step / 2 + 1e-12)
+
+    def test_u1_round_trip(self):
+        self.check_round_trip("u1")
+
+    def test_u2_round_trip(self):
+        self.check_round_trip("u2")
+
+    def test_out_of_range_is_clipped(self):
+        np.testing.assert_array_equal(quantize([-100, 100], "u1"), [0, 255])
+
+    def test_typed_array_payload(self):
+        packed = encode_intensity(self.values, "u2")
+        self.assertEqual(packed["dtype"], "u2")
+        decoded = np.frombuffer(base64.b64decode(packed["bdata"]), dtype="<u2")
+        np.testing.assert_array_equal(decoded, quantize(self.values, "u2"))
+        self.assertIs(encode_intensity(self.values, "float"), self.values)
+        with self.assertRaises(ValueError):
+            encode_intensity(self.values, "u4")
+
+    def test_color_range_keeps_ticks(self):
+        ticks = color_range("u1")
+        self.assertEqual((ticks["cmin"], ticks["cmax"]), (0, 255))
+        np.testing.assert_allclose(dequantize(ticks["tickvals"], "u1"), [-6, -3, 0, 3, 6], atol=0.03)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+'''
+Pruebas de las funciones que arman las figuras del explorador
+
+se corren desde la raiz del proyecto con un config.json (basta con copiar
+config_template.json), p.ej.
+python -m unittest discover testing
+'''
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from src.py.utils.utils import event_trace, heat_raster
+
+
+class TestHeatRaster(unittest.TestCase):
+    '''
+    el heatmap se agrega a un numero fijo de columnas uint8
+    '''
+    def setUp(self) -> None:
+        samples = np.arange(1000)
+        self.frame = pd.DataFrame(
+            {"attention0": samples / 10.0, "meditation0": 100 - samples / 10.0},
+            index=pd.Index(samples + 50, name="sample")
+        )
+        self.bounds = (self.frame.min(), self.frame.max())
+
+    def test_shape_and_scale(self):
+        x, z = heat_raster(self.frame, self.bounds, width=100, how="mean")
+        self.assertEqual(z.shape, (2, 100))
+        self.assertEqual(z.dtype, np.uint8)
+        np.testing.assert_array_equal(x[:3], [50, 60, 70])
+        # una rampa normalizada sube en una fila y baja en la otra
+        self.assertTrue(np.all(np.diff(z[0].astype(int)) >= 0))
+        self.assertTrue(np.all(np.diff(z[1].astype(int)) <= 0))
+        self.assertEqual(z[0, -1], 254)
+
+    def test_max_keeps_the_end(self):
+        _, z = heat_raster(self.frame, self.bounds, width=100, how="max")
+        self.assertEqual(z[0, -1], 255)
+        self.assertEqual(z[1, 0], 255)
+
+    def test_short_frame_and_gaps(self):
+        frame = self.frame.iloc[:10].copy()
+        frame.iloc[3, 0] = np.nan
+        x, z = heat_raster(frame, self.bounds, width=100)
+        self.assertEqual(z.shape, (2, 10))
+        np.testing.assert_array_equal(x, frame.index)
+        # sin datos queda en 0
+        self.assertEqual(z[0, 3], 0)
+
+
+class TestEventTrace(unittest.TestCase):
+    '''
+    todos los eventos van en una sola traza separados por NaN
+    '''
+    def setUp(self) -> None:
+        self.events = pd.DataFrame({
+            "time": [0, 40, 80, 120],
+            "event": ["inicio", "evento1", "evento2", "final"],
+        })
+
+    def test_one_segment_per_event(self):
+        trace = event_trace(self.events)
+        self.assertEqual(trace.yaxis, "y2")
+        self.assertEqual(len(trace.x), 12)
+        np.testing.assert_array_equal(trace.x[0::3], [0, 40, 80, 120])
+        self.assertTrue(np.isnan(trace.x[2::3]).all())
+        np.testing.assert_array_equal(trace.y[:2], [0, 1])
+        self.assertEqual(list(trace.text[0::3]), ["inicio", "evento1", "evento2", "final"])
+
+    def test_filter_by_type_and_range(self):
+        trace = event_trace(self.events, event_types=["evento1", "final"])
+        np.testing.assert_array_equal(trace.x[0::3], [40, 120])
+
+        trace = event_trace(self.events, x_range=(30, 100))
+        self.assertEqual(list(trace.text[0::3]), ["evento1", "evento2"])
+
+        trace = event_trace(self.events, event_types=["final"], x_range=(30, 100))
+        self.assertEqual(len(trace.x), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
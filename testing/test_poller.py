@@ -0,0 +1,97 @@
+'''
+Pruebas del sondeo concurrente contra un servidor HTTP local
+
+se corren desde la raiz del proyecto con un config.json (basta con copiar
+config_template.json), p.ej.
+python -m unittest discover testing
+'''
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from src.py.acquisition.poller import SensorPoller
+from src.py.acquisition.recorder import to_memory
+from src.py.utils.utils import Utils
+
+# lo que tarda /lento en responder, mas que el limite de las pruebas
+SLOW = 1.0
+DEADLINE = 0.3
+
+
+class SensorHandler(BaseHTTPRequestHandler):
+    '''
+    /ok responde una lectura, /lento tarda SLOW segundos y /error responde 500
+    '''
+    def do_GET(self):
+        if self.path == "/lento/":
+            time.sleep(SLOW)
+        if self.path == "/error/":
+            self.send_response(500)
+            self.end_headers()
+            return
+        body = json.dumps({"data":list(range(len(Utils.SENSOR_PARAMS)))}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        ...
+
+
+class TestSensorPoller(unittest.TestCase):
+    '''
+    los sensores lentos o con error se reportan como perdidos y no retrasan el tick
+    '''
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), SensorHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self) -> None:
+        self.poller = SensorPoller(
+            {
+                "ok":f"{self.url}/ok/",
+                "lento":f"{self.url}/lento/",
+                "error":f"{self.url}/error/",
+            },
+            deadline=DEADLINE
+        )
+
+    def tearDown(self) -> None:
+        self.poller.close()
+
+    def test_missed_sensors(self):
+        readings, missed = self.poller.poll()
+
+        self.assertEqual(missed, ["lento", "error"])
+        self.assertEqual(self.poller.last_missed, missed)
+        self.assertLess(self.poller.last_latency, SLOW)
+        np.testing.assert_array_equal(readings[0], np.arange(len(Utils.SENSOR_PARAMS)))
+        self.assertTrue(np.isnan(readings[1]).all())
+        self.assertTrue(np.isnan(readings[2]).all())
+
+    def test_missed_sensor_leaves_gaps_in_memory(self):
+        readings, _ = self.poller.poll()
+        # to_memory nombra las lecturas con los sensores de la configuracion
+        ok, slow, error = list(Utils.SENSORS)[:3]
+        memory = to_memory(1, readings)
+        self.assertEqual(len(memory[ok]), len(Utils.SENSOR_PARAMS))
+        self.assertEqual(memory[slow], {})
+        self.assertEqual(memory[error], {})
+
+
+if __name__ == "__main__":
+    unittest.main()
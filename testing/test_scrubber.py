@@ -0,0 +1,94 @@
+'''
+Pruebas del cache de ventanas del scrubber del timeline
+
+se corren desde la raiz del proyecto con un config.json (basta con copiar
+config_template.json), p.ej.
+python -m unittest discover testing
+'''
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from src.py.database.database import Database
+from src.py.database.scrubber import SessionScrubber
+from src.py.utils.utils import Utils
+
+UID = 20240101120000
+START = 1700000000.0
+WINDOW = 100
+
+
+class CountingDatabase(Database):
+    '''
+    Database que anota las ventanas que se leen con get_session
+    '''
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.reads = []
+
+    def get_session(self, uid, start, stop, *args, **kwargs):
+        self.reads.append(start // WINDOW)
+        return super().get_session(uid, start, stop, *args, **kwargs)
+
+
+class TestSessionScrubber(unittest.TestCase):
+    '''
+    las ventanas se leen una vez, la ultima se vuelve a leer solo si crecio
+    '''
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = CountingDatabase(os.path.join(self.tmp.name, "test.db"))
+        self.header = Database.get_params_header(Utils.SENSORS.values(), Utils.SENSOR_PARAMS)
+        self.db.create_session(UID, self.header)
+        self.recorded = 0
+        self.record(250)
+        self.scrubber = SessionScrubber(self.db, window=WINDOW)
+
+    def tearDown(self) -> None:
+        self.scrubber.close()
+        self.db.close()
+        self.tmp.cleanup()
+
+    def record(self, samples:int) -> None:
+        for sample in range(self.recorded, self.recorded + samples):
+            readings = [np.full(len(Utils.SENSOR_PARAMS), float(sample))] * len(Utils.SENSORS)
+            self.db.record_data(UID, self.header, readings, sample, START + sample)
+        self.recorded += samples
+        self.db.flush()
+
+    def wait_prefetch(self) -> None:
+        # el pool tiene un solo hilo: una tarea vacia espera a las anteriores
+        self.scrubber._prefetcher.submit(lambda: None).result()
+
+    def test_windows_are_cached_and_prefetched(self):
+        sample, memory = self.scrubber.sample_at(UID, 10.2)
+        self.assertEqual(sample, 10)
+        self.assertEqual(memory[next(iter(Utils.SENSORS))][Utils.SENSOR_PARAMS[0]], 10.0)
+        self.wait_prefetch()
+        self.assertEqual(sorted(self.db.reads), [0, 1])
+
+        self.scrubber.sample_at(UID, 150)
+        self.scrubber.sample_at(UID, 20)
+        self.wait_prefetch()
+        # la ventana 2 se precargo al abrir la 1, nada se leyo dos veces
+        self.assertEqual(sorted(self.db.reads), [0, 1, 2])
+
+    def test_partial_last_window(self):
+        self.assertEqual(self.scrubber.sample_at(UID, 249)[0], 249)
+        self.scrubber.sample_at(UID, 240)
+        self.wait_prefetch()
+        # la ventana parcial se guarda y no se precarga la 3, que esta vacia
+        self.assertEqual(sorted(self.db.reads), [1, 2])
+
+        self.record(20)
+        sample, memory = self.scrubber.sample_at(UID, 1000)
+        self.assertEqual(sample, 269)
+        self.assertIsNotNone(memory)
+        self.wait_prefetch()
+        self.assertEqual(sorted(self.db.reads), [1, 2, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+'''
+Pruebas del cache de sesiones del explorador
+
+se corren desde la raiz del proyecto con un config.json (basta con copiar
+config_template.json), p.ej.
+python -m unittest discover testing
+'''
+import os
+import tempfile
+import unittest
+from contextlib import closing
+
+import numpy as np
+
+from src.py.database.database import Database, LEGACY_OFFSET
+from src.py.database.session_cache import LoadedSession, SessionCache
+from src.py.utils.utils import RAW_READ_FACTOR, Utils
+
+UID = 20230101120000
+
+
+class SessionCacheTestCase(unittest.TestCase):
+    '''
+    abre una base nueva en un directorio temporal para cada prueba
+    '''
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = Database(os.path.join(self.tmp.name, "test.db"))
+        self.header = Database.get_params_header(Utils.SENSORS.values(), Utils.SENSOR_PARAMS)
+
+    def tearDown(self) -> None:
+        self.db.close()
+        self.tmp.cleanup()
+
+    def session(self, rows:int, uid:int = UID) -> None:
+        '''
+        sesion con sample y time y eventos al inicio y al final
+        '''
+        if not self.db.session_table_exists():
+            self.db.create_session_table()
+        self.db.record_session_info(uid, Utils.SENSORS.keys(), "")
+        self.db.create_session(uid, self.header)
+        for sample in range(rows):
+            readings = [np.full(len(Utils.SENSOR_PARAMS), float(sample))] * len(Utils.SENSORS)
+            self.db.record_data(uid, self.header, readings, sample, 1700000000.0 + sample)
+        self.db.flush()
+        self.db.create_events(uid)
+        self.db.record_event(uid, 0, "inicio")
+        self.db.record_event(uid, rows, "final")
+
+    def legacy_session(self, rows:int, uid:int = UID) -> None:
+        '''
+        tabla session_{uid} como las de antes, sin sample ni time, con el
+        numero de fila en todas las columnas
+        '''
+        columns = len(Utils.SENSORS) * len(Utils.SENSOR_PARAMS)
+        with self.db._write() as conn, closing(conn.cursor()) as cur:
+            cur.execute(f'CREATE TABLE session_{uid}({self.header[0]})')
+            cur.executemany(
+                f'INSERT INTO session_{uid} VALUES ({self.header[1]})',
+                [(row,) * columns for row in range(rows)]
+            )
+        self.db.create_events(uid)
+        self.db.record_event(uid, 0, "inicio")
+        self.db.record_event(uid, rows, "final")
+
+
+class TestLegacyZoom(SessionCacheTestCase):
+    '''
+    un zoom en una sesion antigua larga devuelve el rango del eje x pedido
+    '''
+    def test_zoom_uses_index_values(self):
+        rows = Utils.PLOT_MAX_POINTS * RAW_READ_FACTOR + 1000
+        self.legacy_session(rows)
+        session = LoadedSession(UID, self.db)
+        self.assertFalse(session.raw)
+
+        column = f"{Utils.SENSOR_PARAMS[0]}0"
+        frame = session.frame([column], 100, 200)
+        np.testing.assert_array_equal(frame.index, np.arange(100, 200))
+        # el valor guardado es la posicion de la fila
+        np.testing.assert_array_equal(frame[column], np.arange(100, 200) + LEGACY_OFFSET)
+
+
+class TestSessionCache(SessionCacheTestCase):
+    '''
+    LRU por bytes y lectura de nuevo cuando cambia la version
+    '''
+    def setUp(self) -> None:
+        super().setUp()
+        for uid in (1, 2, 3):
+            self.session(100, uid)
+        self.size = SessionCache(self.db).get(1).nbytes
+
+    def test_evicts_least_recently_used(self):
+        cache = SessionCache(self.db, max_bytes=int(self.size * 2.5))
+        first = cache.get(1)
+        cache.get(2)
+        self.assertIs(cache.get(1), first)
+        cache.get(3)
+        # la 2 es la menos usada
+        self.assertEqual(list(cache._sessions), [1, 3])
+        self.assertIs(cache.get(1), first)
+
+    def test_keeps_requested_session_over_limit(self):
+        cache = SessionCache(self.db, max_bytes=self.size // 2)
+        cache.get(1)
+        cache.get(2)
+        self.assertEqual(list(cache._sessions), [2])
+
+    def test_reloads_on_new_version(self):
+        cache = SessionCache(self.db)
+        first = cache.get(1, self.db.session_version(1))
+        self.assertIs(cache.get(1, self.db.session_version(1)), first)
+        self.db.update_notes(1, "nota")
+        self.assertIsNot(cache.get(1, self.db.session_version(1)), first)
+        cache.invalidate(1)
+        self.assertEqual(list(cache._sessions), [])
+
+
+if __name__ == "__main__":
+    unittest.main()